@@ -0,0 +1,90 @@
+"""
+ASGI entry point: `uvicorn asgi:app --port 8000`.
+
+Every request shares the server's single event loop. `/api/reply` is streamed natively
+from `generate_reply_events`, with no per-request thread, private event loop or
+unbounded queue. All other routes, and malformed reply requests, are served by the
+existing Flask app through `WsgiToAsgi`, so their contracts are unchanged.
+"""
+import asyncio
+import logging
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+
+import main
+from shared_loop import shared_loop
+
+logger = logging.getLogger(__name__)
+
+flask_app = WsgiToAsgi(main.app)
+
+REPLY_HEADERS = [
+    (b"content-type", b"text/event-stream; charset=utf-8"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),  # Keep reverse proxies from buffering the stream
+    (b"access-control-allow-origin", b"*"),  # Matches CORS(app) on the Flask routes
+]
+
+
+async def reply_stream(scope, receive, send, refined_prompt: str, session_id: str, trace: bool = False) -> None:
+    """Streams `/api/reply` and cancels generation as soon as the client disconnects."""
+    # The SQLite session store blocks, so keep it off the event loop
+    lang = await asyncio.to_thread(main.session_language, session_id)
+
+    async def stream_events():
+        await send({"type": "http.response.start", "status": 200, "headers": REPLY_HEADERS})
+        events = main.generate_reply_events(refined_prompt, session_id, lang, trace=trace)
+        try:
+            async for item in events:
+                # `send` only returns once the server has room in its write buffer,
+                # which is what keeps a slow client from buffering the whole reply.
+                await send({"type": "http.response.body", "body": item.encode("utf-8"), "more_body": True})
+        finally:
+            await events.aclose()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def wait_for_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    streamer = asyncio.ensure_future(stream_events())
+    watcher = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        done, _ = await asyncio.wait({streamer, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if watcher in done and not streamer.done():
+            logger.info(f"Client disconnected, cancelling reply for session: {session_id}")
+    finally:
+        for task in (streamer, watcher):
+            task.cancel()
+        await asyncio.gather(streamer, watcher, return_exceptions=True)
+    if streamer.done() and not streamer.cancelled() and streamer.exception():
+        raise streamer.exception()
+
+
+async def lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            shared_loop.adopt(asyncio.get_running_loop())
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await shared_loop.run_shutdown_hooks()
+            main.tts_executor.shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send) -> None:
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] == "http" and scope["path"] == "/api/reply" and scope["method"] == "GET":
+        args = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        refined_prompt = args.get("refined_prompt", [None])[0]
+        session_id = args.get("session_id", [None])[0]
+        if all([refined_prompt, session_id, args.get("context_summary", [None])[0]]):
+            trace = args.get("trace", [None])[0] == "1" or (b"x-trace", b"1") in scope.get("headers", [])
+            await reply_stream(scope, receive, send, refined_prompt, session_id, trace=trace)
+            return
+    await flask_app(scope, receive, send)
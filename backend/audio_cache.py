@@ -0,0 +1,169 @@
+import os
+import re
+import hashlib
+import logging
+import threading
+import unicodedata
+from pathlib import Path
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+DISK_RESCAN_WRITES = 100  # Writes between re-measuring the disk tier, which other workers fill too
+
+
+def normalize_narration(text: str) -> str:
+    """Canonicalizes narration text so trivially different strings share a cache entry."""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+@lru_cache(maxsize=None)
+def model_file_hash(model_path: str) -> str:
+    """SHA-256 of a voice model file, so swapping a model invalidates its cached audio."""
+    digest = hashlib.sha256()
+    try:
+        with open(model_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    except OSError:
+        return "missing"
+    return digest.hexdigest()
+
+
+class NarrationAudioCache:
+    """
+    Content-addressed cache for synthesized narration audio, stored in its delivery
+    format (see `audio_encoding.AUDIO_FORMATS`).
+
+    Entries live in an in-memory LRU bounded by total bytes. When `disk_dir` is set,
+    entries are also written there and survive restarts; the disk tier is bounded by
+    `disk_max_bytes` and evicts its oldest files first. Workers sharing `disk_dir` each
+    count only their own writes, so the directory is re-measured every
+    DISK_RESCAN_WRITES writes and the bound holds across them to within that margin.
+    Disk reads and writes block, so async callers run `get` and `put` on a thread.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[Path] = None, disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._disk_bytes = 0
+        self._disk_writes = 0  # Since the directory was last measured
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(p.stat().st_size for p in self.disk_dir.glob("*/*.bin"))
+
+    @staticmethod
+    def key(lang: str, model_hash: str, text: str, fmt: str = "wav") -> str:
+        material = "\x00".join((lang, model_hash, normalize_narration(text), fmt))
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.bin"
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+        if self.disk_dir:
+            try:
+                data = self._disk_path(key).read_bytes()
+            except OSError:
+                data = None
+            if data is not None:
+                self._remember(key, data)
+                with self._lock:
+                    self.disk_hits += 1
+                return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes) -> bool:
+        """Stores an entry; returns whether `get` can return it (False if it was too big to keep anywhere)."""
+        in_memory = self._remember(key, data)
+        on_disk = self._write_to_disk(key, data) if self.disk_dir else False
+        return in_memory or on_disk
+
+    def _remember(self, key: str, data: bytes) -> bool:
+        if len(data) > self.max_bytes:
+            return False
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+        return True
+
+    def _write_to_disk(self, key: str, data: bytes) -> bool:
+        path = self._disk_path(key)
+        if path.exists():
+            return True
+        try:
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write narration audio to disk cache: {e}")
+            return False
+        with self._lock:
+            self._disk_bytes += len(data)
+            self._disk_writes += 1
+            over_budget = self.disk_max_bytes and self._disk_bytes > self.disk_max_bytes
+            rescan = self.disk_max_bytes and self._disk_writes >= DISK_RESCAN_WRITES
+        if over_budget or rescan:
+            self._evict_disk()  # Oldest first, so the entry just written survives
+        return True
+
+    def _evict_disk(self) -> None:
+        """Measures the whole directory and, if it is over budget, deletes its oldest files."""
+        files = []
+        for path in self.disk_dir.glob("*/*.bin"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        # Leave headroom so we don't rescan on every write
+        target = self.disk_max_bytes * 0.9 if total > self.disk_max_bytes else total
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                continue
+        with self._lock:
+            self._disk_bytes = total
+            self._disk_writes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "disk_bytes": self._disk_bytes,
+            }
@@ -0,0 +1,43 @@
+import io
+from typing import Dict, Tuple
+
+import numpy as np
+import soundfile as sf
+
+# Delivery format -> (libsndfile container, subtype, MIME type, file extension)
+AUDIO_FORMATS: Dict[str, Tuple[str, str, str, str]] = {
+    "wav": ("WAV", "PCM_16", "audio/wav", "wav"),
+    "mp3": ("MP3", "MPEG_LAYER_III", "audio/mpeg", "mp3"),
+    "opus": ("OGG", "OPUS", "audio/ogg", "ogg"),
+}
+
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def _resample(samples: np.ndarray, rate: int, target_rate: int) -> np.ndarray:
+    """Linear-interpolation resampling; plenty for narrated speech."""
+    n_out = int(round(len(samples) * target_rate / rate))
+    positions = np.linspace(0, len(samples) - 1, n_out)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(samples.dtype)
+
+
+def encode_audio(wav_bytes: bytes, fmt: str) -> bytes:
+    """Re-encodes a mono WAV file into one of the delivery formats in `AUDIO_FORMATS`."""
+    if fmt == "wav":
+        return wav_bytes
+    container, subtype, _, _ = AUDIO_FORMATS[fmt]
+    samples, rate = sf.read(io.BytesIO(wav_bytes), dtype="float32")
+    if fmt == "opus" and rate not in OPUS_SAMPLE_RATES:
+        target_rate = min(r for r in OPUS_SAMPLE_RATES if r >= rate) if rate < 48000 else 48000
+        samples, rate = _resample(samples, rate, target_rate), target_rate
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, rate, format=container, subtype=subtype)
+    return buffer.getvalue()
+
+
+def audio_mime_type(fmt: str) -> str:
+    return AUDIO_FORMATS[fmt][2]
+
+
+def audio_extension(fmt: str) -> str:
+    return AUDIO_FORMATS[fmt][3]
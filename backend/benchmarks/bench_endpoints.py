@@ -0,0 +1,300 @@
+"""
+End-to-end latency and throughput benchmark for `/api/speech-to-prompt` and `/api/reply`.
+
+Starts the fake Whisper, LLM and Unsplash services from `fake_services.py`, launches
+the backend against them in a subprocess (uvicorn or the Flask server, in a scratch
+working directory so caches start cold) and drives it at a fixed concurrency.
+Reports time-to-first-element, time-to-DONE and p50/p95/p99 latencies, plus the
+server's peak RSS and thread count, as JSON so runs can be compared across commits:
+
+    cd backend && python benchmarks/bench_endpoints.py --requests 50 --concurrency 10 --output before.json
+
+No API keys or network access are needed. Narration audio is only synthesized when
+the Piper voice models are present in `backend/voices`.
+"""
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_services import FakeServiceConfig, FakeServices  # noqa: E402
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Nearest-rank p50/p95/p99 plus mean and max, in milliseconds."""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))]
+
+    return {
+        "p50": round(rank(50) * 1000, 1), "p95": round(rank(95) * 1000, 1), "p99": round(rank(99) * 1000, 1),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 1), "max": round(ordered[-1] * 1000, 1),
+    }
+
+
+def _proc_status(pid: int) -> Dict[str, int]:
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM", "Threads", "PPid"):
+                    fields[key] = int(value.split()[0]) * (1024 if key.startswith("Vm") else 1)
+    except OSError:
+        pass
+    return fields
+
+
+def _child_pids(pid: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit() and _proc_status(int(entry)).get("PPid") == pid:
+            children.append(int(entry))
+    return children
+
+
+class ResourceSampler:
+    """Samples the server's RSS and thread count (and its worker processes') in the background."""
+
+    def __init__(self, pid: int, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak_threads = 0
+        self.peak_rss_with_children = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            status = _proc_status(self.pid)
+            self.peak_threads = max(self.peak_threads, status.get("Threads", 0))
+            total = status.get("VmRSS", 0) + sum(_proc_status(c).get("VmRSS", 0) for c in _child_pids(self.pid))
+            self.peak_rss_with_children = max(self.peak_rss_with_children, total)
+            self._stop.wait(self.interval)
+
+    def start(self) -> "ResourceSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Dict[str, int]:
+        self._stop.set()
+        self._thread.join()
+        return {
+            "peak_rss_bytes": _proc_status(self.pid).get("VmHWM", 0),  # Kernel-tracked high-water mark
+            "peak_rss_bytes_with_children": self.peak_rss_with_children,
+            "peak_threads": self.peak_threads,
+        }
+
+
+def start_backend(server: str, port: int, env: Dict[str, str], workdir: Path, log_file) -> subprocess.Popen:
+    if server == "uvicorn":
+        command = [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port), "--log-level", "warning"]
+    else:
+        command = [sys.executable, "-m", "flask", "--app", "main", "run", "--port", str(port), "--with-threads"]
+    env = {**os.environ, **env, "PYTHONPATH": str(BACKEND_DIR)}
+    return subprocess.Popen(command, cwd=workdir, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Backend exited with status {process.returncode} during startup.")
+        try:
+            if httpx.get(f"{base_url}/api/voices", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError("Backend did not become ready in time.")
+
+
+def context_image() -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (1600, 1200), (200, 220, 255)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class Driver:
+    """Issues the benchmark requests and records per-request timings."""
+
+    def __init__(self, base_url: str, args):
+        self.base_url = base_url
+        self.args = args
+        self.audio = os.urandom(args.audio_bytes)
+        self.image = context_image() if args.images else b""
+        self.stp_latencies: List[float] = []
+        self.reply_first_element: List[float] = []
+        self.reply_done: List[float] = []
+        self.elements: List[int] = []
+        self.errors: Dict[str, int] = {"speech_to_prompt": 0, "reply": 0}
+
+    async def speech_to_prompt(self, client: httpx.AsyncClient, session_id: str) -> Optional[Dict[str, Any]]:
+        files = [("audio_file", ("speech.webm", self.audio, "audio/webm"))]
+        files += [(f"image_file_{i}", (f"canvas-image-{i}.png", self.image, "image/png")) for i in range(self.args.images)]
+        started = time.perf_counter()
+        try:
+            response = await client.post(f"{self.base_url}/api/speech-to-prompt", data={"session_id": session_id}, files=files)
+            response.raise_for_status()
+        except httpx.HTTPError:
+            self.errors["speech_to_prompt"] += 1
+            return None
+        self.stp_latencies.append(time.perf_counter() - started)
+        return response.json()
+
+    async def reply(self, client: httpx.AsyncClient, payload: Dict[str, Any]) -> None:
+        params = {k: payload[k] for k in ("refined_prompt", "session_id", "context_summary")}
+        started = time.perf_counter()
+        first_element, elements, done = None, 0, False
+        try:
+            async with client.stream("GET", f"{self.base_url}/api/reply", params=params) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    data = line[len("data: "):]
+                    if data == "[DONE]":
+                        done = True
+                        break
+                    event = json.loads(data)
+                    if "error" in event:
+                        break
+                    if "narration" not in event:
+                        elements += 1
+                        if first_element is None:
+                            first_element = time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        if not done:
+            self.errors["reply"] += 1
+            return
+        self.reply_done.append(time.perf_counter() - started)
+        if first_element is not None:
+            self.reply_first_element.append(first_element)
+        self.elements.append(elements)
+
+    async def one(self, client: httpx.AsyncClient, index: int) -> None:
+        session_id = str(uuid.uuid4())
+        if self.args.scenario in ("full", "speech-to-prompt"):
+            payload = await self.speech_to_prompt(client, session_id)
+            if payload is None or self.args.scenario == "speech-to-prompt":
+                return
+        else:
+            prompt = "Explain cellular respiration step by step with a diagram."
+            if not self.args.repeat_prompts:
+                prompt += f" (request {index})"
+            payload = {"refined_prompt": prompt, "session_id": session_id, "context_summary": "User provided audio only."}
+        await self.reply(client, payload)
+
+    async def run(self) -> float:
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        limits = httpx.Limits(max_connections=self.args.concurrency * 2)
+        async with httpx.AsyncClient(timeout=self.args.timeout, limits=limits) as client:
+            async def bounded(index: int) -> None:
+                async with semaphore:
+                    await self.one(client, index)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(bounded(i) for i in range(self.args.requests)))
+            return time.perf_counter() - started
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=("full", "speech-to-prompt", "reply"), default="full",
+                        help="'full' runs speech-to-prompt followed by reply for each request")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--server", choices=("uvicorn", "flask"), default="uvicorn")
+    parser.add_argument("--port", type=int, default=18765)
+    parser.add_argument("--token-rate", type=float, default=FakeServiceConfig.token_rate, help="LLM tokens per second")
+    parser.add_argument("--elements", type=int, default=FakeServiceConfig.layout_elements, help="Elements per layout")
+    parser.add_argument("--first-token-latency", type=float, default=FakeServiceConfig.first_token_latency)
+    parser.add_argument("--transcription-latency", type=float, default=FakeServiceConfig.transcription_latency)
+    parser.add_argument("--refinement-latency", type=float, default=FakeServiceConfig.refinement_latency)
+    parser.add_argument("--unsplash-latency", type=float, default=FakeServiceConfig.unsplash_latency)
+    parser.add_argument("--images", type=int, default=1, help="Context images per speech-to-prompt request")
+    parser.add_argument("--audio-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--repeat-prompts", action="store_true",
+                        help="Send identical prompts, so the backend's LLM caches can hit")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--server-log", help="File for the backend's output (discarded by default)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    fake_config = FakeServiceConfig(
+        token_rate=args.token_rate, layout_elements=args.elements, first_token_latency=args.first_token_latency,
+        transcription_latency=args.transcription_latency, refinement_latency=args.refinement_latency,
+        unsplash_latency=args.unsplash_latency, unique_prompts=not args.repeat_prompts,
+    )
+    services = FakeServices(fake_config).start()
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    with tempfile.TemporaryDirectory(prefix="tutorlm-bench-") as workdir, \
+            open(args.server_log or os.devnull, "w") as log_file:
+        process = start_backend(args.server, args.port, services.environment(), Path(workdir), log_file)
+        try:
+            wait_until_ready(base_url, process)
+            sampler = ResourceSampler(process.pid).start()
+            driver = Driver(base_url, args)
+            elapsed = asyncio.run(driver.run())
+            resources = sampler.stop()
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            services.stop()
+
+    completed = len(driver.reply_done) if args.scenario != "speech-to-prompt" else len(driver.stp_latencies)
+    report = {
+        "revision": git_revision(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "server_log")},
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(completed / elapsed, 2) if elapsed else None,
+        "errors": driver.errors,
+        "speech_to_prompt_ms": percentiles(driver.stp_latencies),
+        "reply_first_element_ms": percentiles(driver.reply_first_element),
+        "reply_done_ms": percentiles(driver.reply_done),
+        "reply_elements_mean": round(sum(driver.elements) / len(driver.elements), 1) if driver.elements else None,
+        "server": resources,
+        "fake_service_requests": services.requests,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
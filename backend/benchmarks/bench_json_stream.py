@@ -0,0 +1,117 @@
+"""
+Micro-benchmark for the streaming JSON element parser.
+
+Feeds large synthetic LLM responses to `JSONObjectStream` in several chunk sizes and
+compares it with the original inline parser from `reply_stream`, which re-measured the
+accumulated response for every character and kept all of it in memory.
+
+    cd backend && python benchmarks/bench_json_stream.py --elements 2000
+"""
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from json_stream import JSONObjectStream  # noqa: E402
+
+
+def legacy_parse(chunks):
+    """The parser previously inlined in `event_generator`, kept here as the baseline."""
+    objects = []
+    accumulated_content = ""
+    bracket_count = 0
+    in_string = False
+    escape_next = False
+    object_start = -1
+    for delta in chunks:
+        accumulated_content += delta
+        for i, char in enumerate(delta):
+            pos = len(accumulated_content) - len(delta) + i
+            if in_string:
+                if escape_next: escape_next = False
+                elif char == '\\': escape_next = True
+                elif char == '"': in_string = False
+            else:
+                if char == '"': in_string = True
+                elif char == '{':
+                    if bracket_count == 0: object_start = pos
+                    bracket_count += 1
+                elif char == '}':
+                    bracket_count -= 1
+                    if bracket_count == 0 and object_start != -1:
+                        try:
+                            objects.append(json.loads(accumulated_content[object_start : pos + 1]))
+                        except json.JSONDecodeError:
+                            pass
+    return objects
+
+
+def incremental_parse(chunks):
+    parser = JSONObjectStream()
+    objects = []
+    for delta in chunks:
+        objects.extend(parser.feed(delta))
+    parser.close()
+    return objects
+
+
+def synthetic_response(n_elements: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = ["cell", "membrane", "energy", "$E=mc^2$", "**bold**", "{braces}", 'say "hi"', "back\\slash", "ñandú"]
+    elements = []
+    for i in range(n_elements):
+        content = " ".join(rng.choice(words) for _ in range(rng.randint(5, 60)))
+        elements.append({
+            "type": rng.choice(["text", "card", "image"]),
+            "content": content,
+            "fontSize": rng.randint(14, 32),
+            "x": rng.randint(0, 800), "y": 50 + 100 * i,
+            "speakAloud": content[::-1],
+        })
+    return "Here is your layout:\n```json\n" + json.dumps(elements, indent=2, ensure_ascii=False) + "\n```\n"
+
+
+def best_of(repeat: int, fn, *args):
+    """Returns (result, fastest wall time) over `repeat` runs."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def chunked(text: str, size: int):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--elements", type=int, default=1000, help="Elements in the synthetic response")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[1, 4, 16, 64, 512])
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the fastest is reported")
+    parser.add_argument("--skip-legacy", action="store_true", help="Only time the incremental parser")
+    args = parser.parse_args()
+
+    text = synthetic_response(args.elements)
+    print(f"Synthetic response: {len(text):,} chars, {args.elements} elements")
+    print(f"{'chunk':>6} {'incremental (s)':>16} {'legacy (s)':>12} {'speedup':>8}")
+    for size in args.chunk_sizes:
+        chunks = chunked(text, size)
+        objects, incremental_s = best_of(args.repeat, incremental_parse, chunks)
+        assert len(objects) == args.elements, f"expected {args.elements} objects, got {len(objects)}"
+
+        if args.skip_legacy:
+            print(f"{size:>6} {incremental_s:>16.4f}")
+            continue
+        baseline, legacy_s = best_of(args.repeat, legacy_parse, chunks)
+        assert baseline == objects, "parsers disagree"
+        print(f"{size:>6} {incremental_s:>16.4f} {legacy_s:>12.4f} {legacy_s / incremental_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Latency and accuracy of chunked transcription against the fake Whisper endpoint.
+
+Synthesizes a recording with `tone_speech` (one tone per "word", which the fake
+service transcribes exactly), then transcribes it whole and in concurrent chunks
+through `transcription.ChunkedTranscriber`, the same way the backend does. Reports
+each mode's latency and whether the stitched transcript has every word, in order,
+exactly once:
+
+    cd backend && python benchmarks/bench_transcription.py --seconds 300 --concurrency 4
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+import soundfile as sf
+from openai import AsyncOpenAI
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_services import (  # noqa: E402
+    FakeServiceConfig, FakeServices, TONE_GAP_SECONDS, TONE_PAUSE_SECONDS, TONE_WORD_SECONDS, tone_speech, tone_word,
+)
+from transcription import ChunkedTranscriber  # noqa: E402
+
+RATE = 16000
+
+
+async def run_mode(client: AsyncOpenAI, path: Path, chunk_seconds: float, args) -> dict:
+    async def transcribe(file) -> str:
+        return (await client.audio.transcriptions.create(model="whisper-1", file=file)).text
+
+    transcriber = ChunkedTranscriber(
+        transcribe, chunk_seconds=chunk_seconds, overlap_seconds=args.overlap_seconds, max_concurrency=args.concurrency
+    )
+    started = time.perf_counter()
+    text = await transcriber.transcribe(path, path.name)
+    elapsed = time.perf_counter() - started
+    words = text.split()
+    return {
+        "latency_ms": round(elapsed * 1000, 1),
+        "words": len(words),
+        "exact": words == [tone_word(i) for i in range(args.words)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=180.0, help="Approximate recording length")
+    parser.add_argument("--pause-every", type=int, default=8, help="Words between silent pauses; 0 for none")
+    parser.add_argument("--chunk-seconds", type=float, default=30.0)
+    parser.add_argument("--overlap-seconds", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--transcription-latency", type=float, default=FakeServiceConfig.transcription_latency)
+    parser.add_argument("--realtime-factor", type=float, default=FakeServiceConfig.transcription_realtime_factor,
+                        help="Fake Whisper seconds per second of audio")
+    args = parser.parse_args()
+    word_seconds = TONE_WORD_SECONDS + TONE_GAP_SECONDS
+    if args.pause_every:
+        word_seconds += (TONE_PAUSE_SECONDS - TONE_GAP_SECONDS) / args.pause_every
+    args.words = max(1, int(args.seconds / word_seconds))
+
+    services = FakeServices(FakeServiceConfig(
+        transcription_latency=args.transcription_latency, transcription_realtime_factor=args.realtime_factor,
+    )).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="tutorlm-bench-") as workdir:
+            path = Path(workdir) / "recording.wav"
+            samples = tone_speech(args.words, RATE, args.pause_every)
+            sf.write(path, samples, RATE)
+
+            async def run() -> dict:
+                client = AsyncOpenAI(base_url=f"{services.url}/v1", api_key="fake")
+                return {
+                    "whole": await run_mode(client, path, 0, args),
+                    "chunked": await run_mode(client, path, args.chunk_seconds, args),
+                }
+
+            results = asyncio.run(run())
+    finally:
+        services.stop()
+
+    report = {
+        "config": {**vars(args), "audio_seconds": round(len(samples) / RATE, 1)},
+        **results,
+        "fake_service_requests": services.requests["transcriptions"],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
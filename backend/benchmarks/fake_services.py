@@ -0,0 +1,308 @@
+"""
+Local stand-ins for the external services the backend calls, for benchmarks.
+
+One threaded HTTP server answers, with configurable latencies:
+
+- `POST /v1/audio/transcriptions` (Whisper, via `OPENAI_BASE_URL`). Audio made by
+  `tone_speech` is "transcribed" exactly, one word per tone, taking longer the longer
+  the upload, so chunked transcription can be checked for order and overlap handling.
+- `POST /v1/chat/completions` (both RunPod endpoints, via `BASE_URL_3`/`BASE_URL_3N`).
+  Streamed completions emit a synthetic canvas layout at `token_rate` tokens per
+  second; non-streamed ones return a refined prompt.
+- `GET /search/photos` (Unsplash, via `UNSPLASH_SEARCH_URL`)
+
+Run it on its own to point a development server at it:
+
+    cd backend && python benchmarks/fake_services.py --port 18000
+"""
+import io
+import re
+import json
+import time
+import argparse
+import threading
+import itertools
+from dataclasses import dataclass
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import soundfile as sf
+
+_TOKEN_RE = re.compile(r"\s*\S{1,4}|\s+")  # ~4 characters per token, like BPE vocabularies
+_PROMPT_INDEX_RE = re.compile(r"\(request (\d+)\)")
+
+# Synthetic speech: word i is a tone at TONE_BASE_HZ + TONE_STEP_HZ * (i % TONE_WORDS)
+TONE_BASE_HZ, TONE_STEP_HZ, TONE_WORDS = 400.0, 50.0, 64
+TONE_WORD_SECONDS, TONE_GAP_SECONDS, TONE_PAUSE_SECONDS = 0.3, 0.05, 0.6
+_TONE_FRAME_SECONDS = 0.05
+
+
+@dataclass
+class FakeServiceConfig:
+    token_rate: float = 200.0  # Streamed completion tokens per second; 0 streams without delay
+    layout_elements: int = 8
+    first_token_latency: float = 0.3  # Seconds before the first streamed token
+    transcription_latency: float = 0.5
+    transcription_realtime_factor: float = 0.1  # Extra seconds per second of decodable audio
+    refinement_latency: float = 0.3
+    unsplash_latency: float = 0.05
+    unique_prompts: bool = True  # Number each transcript so the backend's LLM caches never hit
+
+
+def synthetic_layout(n_elements: int, seed: int = 0) -> List[Dict]:
+    """A layout shaped like the model's output: narrated text, cards and images."""
+    elements = [{
+        "type": "text", "content": f"Lesson {seed}: how cells make energy", "fontSize": 28,
+        "x": 50, "y": 50, "speakAloud": "Let's look at how cells make energy.",
+    }]
+    for i in range(1, n_elements):
+        y = 110 + 120 * (i // 2)
+        if i % 3 == 2:
+            elements.append({
+                "type": "image", "search": f"mitochondria diagram {i % 5}", "x": 450, "y": y, "width": 300,
+                "speakAloud": "Here is a diagram of the process.",
+            })
+        else:
+            elements.append({
+                "type": "card", "content": f"Step {i}: glucose is broken down and its energy stored as ATP.",
+                "fontSize": 16, "x": 50, "y": y, "width": 350,
+                "speakAloud": f"Step {i}. Glucose is broken down, and the energy is stored as ATP.",
+            })
+    return elements
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text)
+
+
+def tone_word(i: int) -> str:
+    return f"w{i % TONE_WORDS}"
+
+
+def tone_speech(n_words: int, rate: int = 16000, pause_every: int = 8) -> np.ndarray:
+    """
+    `n_words` tone "words" as 16-bit samples. Words are separated by short, quiet-but-
+    not-silent gaps, and by a silent pause every `pause_every` words (0: never), so a
+    splitter finds both silences and stretches that must be cut mid-speech.
+    """
+    t = np.arange(int(TONE_WORD_SECONDS * rate)) / rate
+    gap = np.full(int(TONE_GAP_SECONDS * rate), 0.03)
+    pause = np.zeros(int(TONE_PAUSE_SECONDS * rate))
+    parts = []
+    for i in range(n_words):
+        parts.append(0.5 * np.sin(2 * np.pi * (TONE_BASE_HZ + TONE_STEP_HZ * (i % TONE_WORDS)) * t))
+        parts.append(pause if pause_every and (i + 1) % pause_every == 0 else gap)
+    return (np.concatenate(parts) * 32767).astype(np.int16)
+
+
+def decode_tone_words(samples: np.ndarray, rate: int) -> List[str]:
+    """The words of `tone_speech` audio: the dominant tone of each loud frame, with repeats collapsed."""
+    frame = int(_TONE_FRAME_SECONDS * rate)
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return []
+    frames = samples[:n_frames * frame].reshape(n_frames, frame).astype(np.float32) / 32768.0
+    loud = np.sqrt(np.mean(frames * frames, axis=1)) > 0.1
+    peaks = np.argmax(np.abs(np.fft.rfft(frames * np.hanning(frame), axis=1)), axis=1) * rate / frame
+    indexes = np.rint((peaks - TONE_BASE_HZ) / TONE_STEP_HZ).astype(int)
+
+    # Runs of one tone; single frames are where two tones meet inside a frame
+    words, run_index, run_length = [], None, 0
+    for index in list(np.where(loud, indexes, -1)) + [-1]:
+        if index == run_index:
+            run_length += 1
+            continue
+        if run_index is not None and run_index >= 0 and run_length >= 2:
+            words.append(tone_word(int(run_index)))
+        run_index, run_length = index, 1
+    return words
+
+
+def _multipart_file(content_type: str, body: bytes) -> Optional[bytes]:
+    message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    for part in message.iter_parts():
+        if part.get_param("name", header="content-disposition") == "file":
+            return part.get_payload(decode=True)
+    return None
+
+
+class FakeServices:
+    """The fake API server. `start()` serves on a daemon thread; `url` is its base URL."""
+
+    def __init__(self, config: FakeServiceConfig, host: str = "127.0.0.1", port: int = 0):
+        self.config = config
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {"transcriptions": 0, "completions": 0, "streams": 0, "unsplash": 0}
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environment(self) -> Dict[str, str]:
+        """Environment variables that point the backend at these fakes."""
+        return {
+            "OPENAI_API_KEY": "fake", "RUNPOD_API_KEY": "fake", "UNSPLASH_ACCESS_KEY": "fake",
+            "OPENAI_BASE_URL": f"{self.url}/v1", "BASE_URL_3": f"{self.url}/v1", "BASE_URL_3N": f"{self.url}/v1",
+            "UNSPLASH_SEARCH_URL": f"{self.url}/search/photos",
+        }
+
+    def start(self) -> "FakeServices":
+        threading.Thread(target=self.server.serve_forever, name="fake-services", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, kind: str) -> int:
+        with self._lock:
+            self.requests[kind] += 1
+        return next(self._counter)
+
+    def _handler_class(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _read_body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            def _send_json(self, payload: Dict, status: int = 200) -> None:
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != "/search/photos":
+                    return self._send_json({"error": "not found"}, 404)
+                services._count("unsplash")
+                time.sleep(services.config.unsplash_latency)
+                query = parse_qs(url.query).get("query", [""])[0]
+                self._send_json({"results": [{
+                    "urls": {"regular": f"https://images.example.invalid/{query.replace(' ', '-')}.jpg"},
+                    "width": 1080, "height": 720,
+                }]})
+
+            def do_POST(self):
+                body = self._read_body()
+                path = urlparse(self.path).path
+                if path.endswith("/audio/transcriptions"):
+                    return self._transcription(_multipart_file(self.headers.get("Content-Type", ""), body))
+                if path.endswith("/chat/completions"):
+                    request = json.loads(body or b"{}")
+                    if request.get("stream"):
+                        return self._stream_completion(request)
+                    return self._completion(request)
+                self._send_json({"error": "not found"}, 404)
+
+            def _transcription(self, audio: Optional[bytes]):
+                n = services._count("transcriptions")
+                config = services.config
+                try:
+                    samples, rate = sf.read(io.BytesIO(audio or b""), dtype="int16")
+                except (RuntimeError, TypeError):
+                    samples = None  # Not real audio, e.g. the endpoint benchmark's random bytes
+                if samples is None:
+                    time.sleep(config.transcription_latency)
+                    text = "Explain how cells make energy."
+                    if config.unique_prompts:
+                        text += f" (request {n})"
+                    return self._send_json({"text": text})
+                if samples.ndim > 1:
+                    samples = samples[:, 0]
+                time.sleep(config.transcription_latency + config.transcription_realtime_factor * len(samples) / rate)
+                self._send_json({"text": " ".join(decode_tone_words(samples, rate))})
+
+            def _completion(self, request: Dict):
+                services._count("completions")
+                time.sleep(services.config.refinement_latency)
+                user = request.get("messages", [{}])[-1].get("content", "")
+                if isinstance(user, list):
+                    user = " ".join(part.get("text", "") for part in user if isinstance(part, dict))
+                match = _PROMPT_INDEX_RE.search(user)
+                prompt = "Explain cellular respiration step by step with a diagram."
+                if match:
+                    prompt += f" (request {match.group(1)})"
+                self._send_json({
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                    "model": request.get("model", "fake"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": prompt}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                })
+
+            def _stream_completion(self, request: Dict):
+                services._count("streams")
+                config = services.config
+                layout = "```json\n" + json.dumps(synthetic_layout(config.layout_elements), indent=2) + "\n```"
+                delay = 1.0 / config.token_rate if config.token_rate > 0 else 0.0
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                time.sleep(config.first_token_latency)
+
+                def chunk(delta: Dict, finish_reason=None) -> None:
+                    event = json.dumps({
+                        "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": request.get("model", "fake"),
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                    })
+                    data = f"data: {event}\n\n".encode()
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+
+                try:
+                    started = time.perf_counter()
+                    for i, token in enumerate(tokenize(layout)):
+                        # Pace against the start time so per-write overhead doesn't slow the rate
+                        wait = started + i * delay - time.perf_counter()
+                        if wait > 0:
+                            time.sleep(wait)
+                        chunk({"content": token})
+                    chunk({}, finish_reason="stop")
+                    done = b"data: [DONE]\n\n"
+                    self.wfile.write(f"{len(done):x}\r\n".encode() + done + b"\r\n0\r\n\r\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The backend cancelled the stream
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=18000)
+    parser.add_argument("--token-rate", type=float, default=FakeServiceConfig.token_rate)
+    parser.add_argument("--elements", type=int, default=FakeServiceConfig.layout_elements)
+    args = parser.parse_args()
+
+    services = FakeServices(FakeServiceConfig(token_rate=args.token_rate, layout_elements=args.elements), port=args.port)
+    print("Point the backend at the fakes with:")
+    for name, value in services.environment().items():
+        print(f"  export {name}={value}")
+    try:
+        services.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import io
+import base64
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+_MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+def original_data_url(content: bytes, filename: str) -> str:
+    ext = Path(filename or "").suffix.lstrip('.').lower() or "png"
+    if ext == "jpg": ext = "jpeg"
+    return f"data:image/{ext};base64,{base64.b64encode(content).decode()}"
+
+
+def prepare_image(path: Path, filename: str, max_edge: int, fmt: str, quality: int) -> Tuple[str, int]:
+    """
+    Downscales an uploaded image file so its longest edge is at most `max_edge` and
+    re-encodes it. Returns (data URL, encoded size). The original bytes are kept when
+    they are already smaller, or when the upload cannot be decoded.
+    """
+    original_size = Path(path).stat().st_size
+    try:
+        with Image.open(path) as img:
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            if img.mode not in ("RGB", "L"):
+                # JPEG has no alpha channel, so flatten transparent canvas snapshots onto white
+                rgba = img.convert("RGBA")
+                img = Image.new("RGB", rgba.size, (255, 255, 255))
+                img.paste(rgba, mask=rgba.getchannel("A"))
+            buffer = io.BytesIO()
+            img.save(buffer, format=fmt.upper(), quality=quality, optimize=True)
+    except Exception as e:
+        logger.warning(f"Could not re-encode image {filename}, sending it unchanged: {e}")
+        return original_data_url(Path(path).read_bytes(), filename), original_size
+
+    encoded = buffer.getvalue()
+    if len(encoded) >= original_size:
+        return original_data_url(Path(path).read_bytes(), filename), original_size
+    return f"data:{_MIME_TYPES[fmt]};base64,{base64.b64encode(encoded).decode()}", len(encoded)
+
+
+class ImagePreprocessor:
+    """Prepares a request's context images in parallel on a shared thread pool."""
+
+    def __init__(self, max_edge: int, fmt: str, quality: int, workers: int):
+        if fmt not in _MIME_TYPES:
+            raise ValueError(f"Unsupported image format '{fmt}'; expected one of {sorted(_MIME_TYPES)}.")
+        self.max_edge = max_edge
+        self.fmt = fmt
+        self.quality = quality
+        # Pillow releases the GIL while decoding, resampling and encoding
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-prep")
+
+    def prepare_all(self, uploads: List[Tuple[Path, Optional[str]]]) -> Tuple[List[str], Dict[str, int]]:
+        """Returns the data URLs of the (path, filename) uploads, in order, and the byte savings for the batch."""
+        results = list(self._pool.map(
+            lambda upload: prepare_image(upload[0], upload[1], self.max_edge, self.fmt, self.quality), uploads
+        ))
+        original_bytes = sum(Path(path).stat().st_size for path, _ in uploads)
+        encoded_bytes = sum(size for _, size in results)
+        savings = {
+            "images": len(uploads),
+            "original_bytes": original_bytes,
+            "encoded_bytes": encoded_bytes,
+            "saved_bytes": original_bytes - encoded_bytes,
+        }
+        return [data_url for data_url, _ in results], savings
@@ -0,0 +1,75 @@
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from caching import TTLCache, SingleFlight
+from shared_loop import shared_loop
+
+logger = logging.getLogger(__name__)
+
+
+class UnsplashSearch:
+    """
+    Unsplash photo search through one pooled keep-alive HTTP/2 client.
+
+    The client, result cache and single-flight table all live on the shared I/O loop,
+    so every request reuses the same connections and concurrent identical queries make
+    one upstream call. Queries with no results are cached as `None` for `negative_ttl`.
+    """
+
+    def __init__(self, api_key: Optional[str], search_url: str, ttl: float, negative_ttl: float,
+                 max_entries: int, timeout: float = 10.0):
+        self.api_key = api_key
+        self.search_url = search_url
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.cache = TTLCache(max_entries=max_entries, ttl=ttl)
+        self._single_flight = SingleFlight()
+        self._client: Optional[httpx.AsyncClient] = None
+        shared_loop.on_shutdown(self.aclose)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=True,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+                headers={"Authorization": f"Client-ID {self.api_key}", "Accept-Version": "v1"},
+            )
+        return self._client
+
+    async def search(self, q: str) -> Optional[Dict[str, Any]]:
+        """Returns the first result's details, or `None` when Unsplash has no match."""
+        key = " ".join(q.lower().split())
+        return await shared_loop.run(self._cached_search(key))
+
+    async def _cached_search(self, key: str) -> Optional[Dict[str, Any]]:
+        cached = self.cache.get(key, default=False)
+        if cached is not False:
+            return cached
+        return await self._single_flight.do(key, lambda: self._fetch_and_cache(key))
+
+    async def _fetch_and_cache(self, key: str) -> Optional[Dict[str, Any]]:
+        result = await self._fetch(key)
+        self.cache.set(key, result, ttl=None if result else self.negative_ttl)
+        return result
+
+    async def _fetch(self, q: str) -> Optional[Dict[str, Any]]:
+        response = await self._get_client().get(self.search_url, params={"query": q, "per_page": 1})
+        response.raise_for_status()
+
+        data = response.json()
+        if not data.get("results"):
+            return None
+
+        first_image = data["results"][0]
+        image_url = first_image.get("urls", {}).get("regular")
+        if not image_url:
+            raise ValueError("Unsplash API returned incomplete image data.")
+        return {"imageUrl": image_url, "width": first_image.get("width"), "height": first_image.get("height")}
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,116 @@
+import re
+import json
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Characters that can change the parser state inside an object, and inside a string
+_STRUCTURAL_RE = re.compile(r'[{}"]')
+_STRING_RE = re.compile(r'["\\]')
+
+
+class JSONObjectStream:
+    """
+    Incrementally extracts complete top-level JSON objects from streamed text.
+
+    Text outside objects (code fences, prose, the surrounding `[`, `,` and `]`) is
+    skipped. Only the object currently being read is buffered, and every character is
+    scanned once, so feeding a stream costs O(1) amortized work per character no matter
+    how long the response gets. Objects that fail to decode are counted and logged
+    rather than silently dropped.
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []  # Pieces of the object currently being read
+        self._depth = 0
+        self._in_string = False
+        self._escape_next = False
+        self.objects_parsed = 0
+        self.parse_failures = 0
+        self.chars_scanned = 0
+        self.truncated = False
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Consumes the next chunk and returns the objects it completed, in order."""
+        objects = []
+        self.chars_scanned += len(chunk)
+        # State is kept in locals while scanning; it is written back once at the end
+        depth, in_string, escape_next = self._depth, self._in_string, self._escape_next
+        pos = 0
+        start = 0 if depth else -1  # Where the current object begins in this chunk
+        end = len(chunk)
+
+        while pos < end:
+            if escape_next:
+                escape_next = False
+                pos += 1
+            elif depth == 0:
+                pos = chunk.find("{", pos)
+                if pos == -1:
+                    break
+                start = pos
+                depth = 1
+                pos += 1
+            elif in_string:
+                match = _STRING_RE.search(chunk, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                if match.group() == "\\":
+                    escape_next = True
+                else:
+                    in_string = False
+            else:
+                match = _STRUCTURAL_RE.search(chunk, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                char = match.group()
+                if char == '"':
+                    in_string = True
+                elif char == "{":
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        self._parts.append(chunk[start:pos])
+                        obj = self._decode("".join(self._parts))
+                        self._parts = []
+                        start = -1
+                        if obj is not None:
+                            objects.append(obj)
+
+        if depth and start != -1:
+            self._parts.append(chunk[start:])
+        self._depth, self._in_string, self._escape_next = depth, in_string, escape_next
+        return objects
+
+    def _decode(self, text: str) -> Any:
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError as e:
+            self.parse_failures += 1
+            logger.warning(f"Discarding malformed JSON object from stream ({e}): {text[:200]!r}")
+            return None
+        self.objects_parsed += 1
+        return obj
+
+    def close(self) -> None:
+        """Marks the end of the stream, recording an unfinished trailing object as a failure."""
+        if self._depth:
+            self.truncated = True
+            self.parse_failures += 1
+            logger.warning(f"Stream ended inside a JSON object: {''.join(self._parts)[:200]!r}")
+        self._parts = []
+        self._depth = 0
+        self._in_string = False
+        self._escape_next = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "objects_parsed": self.objects_parsed,
+            "parse_failures": self.parse_failures,
+            "chars_scanned": self.chars_scanned,
+            "truncated": self.truncated,
+        }
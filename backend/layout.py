@@ -0,0 +1,125 @@
+"""
+Server-side placement of canvas elements.
+
+The generation model only suggests positions. `CanvasLayout.place` runs on each
+element as it is emitted, estimates how tall the frontend will render it, and moves
+it down just far enough to clear everything already placed below which it would
+overlap. Placed content is tracked as a skyline (the lowest occupied y as a step
+function of x) in two sorted lists: each placement is two binary searches plus a
+list splice over the steps it covers. The splice shifts the tail of the list, so a
+placement is O(n) in the worst case; with the dozen or so elements of a reply that
+is a few hundred list moves.
+
+The estimates mirror `renderMarkdownToImage` in the frontend: Inter at `fontSize`
+(18px by default) with a 1.6 line height, 16px card and 8px text padding, and
+default widths of 500px for cards and 550px for text.
+"""
+import math
+import re
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Tuple
+
+CHAR_WIDTH_EM = 0.5  # Average advance of an Inter glyph, in ems
+LINE_HEIGHT = 1.6
+DEFAULT_FONT_SIZE = 18
+PADDING = {"card": 16, "text": 8}
+DEFAULT_WIDTH = {"card": 500, "text": 550}
+HEADING_SCALE = {1: 2.0, 2: 1.5, 3: 1.17}  # Browser default sizes of h1-h3
+DEFAULT_IMAGE_ASPECT = 0.75  # Height / width of images whose size is unknown
+GAP = 24  # Vertical space kept between an element and the content above it
+MARGIN = 20  # Elements never start left of or above this
+MIN_SIZE = 1.0  # Widths and font sizes below this (zero, negative) are raised to it
+
+_BLOCK_SPLIT_RE = re.compile(r"\n\s*\n")
+_HEADING_RE = re.compile(r"^(#{1,6})\s+")
+_MARKUP_RE = re.compile(r"\*\*|__|[*_`$]|\\[a-zA-Z]+|^\s*(?:[-+*]|\d+\.)\s+")
+
+
+def _number(value: Any, default: float) -> float:
+    """Coordinates sometimes arrive as strings or nulls; anything unusable becomes `default`."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return number if math.isfinite(number) else default
+
+
+def _visible_length(line: str) -> int:
+    return len(_MARKUP_RE.sub("", _HEADING_RE.sub("", line)).strip())
+
+
+def text_extent(content: str, width: float, font_size: float, padding: float) -> Tuple[float, float]:
+    """
+    Estimated (width, height) of rendered markdown wrapped at `width`. The width is that
+    of the longest line, for short text that doesn't fill its box. Paragraphs carry a
+    1em margin, collapsed between neighbours.
+    """
+    inner = max(width - 2 * padding, font_size)
+    height, widest, blocks = 0.0, 0.0, 0
+    for block in _BLOCK_SPLIT_RE.split(content.strip()):
+        if not block.strip():
+            continue
+        blocks += 1
+        for line in block.split("\n"):
+            heading = _HEADING_RE.match(line)
+            size = font_size * HEADING_SCALE.get(len(heading.group(1)), 1.0) if heading else font_size
+            line_width = _visible_length(line) * CHAR_WIDTH_EM * size
+            widest = max(widest, min(line_width, inner))
+            height += max(1, math.ceil(line_width / inner)) * size * LINE_HEIGHT
+    height += (blocks + 1) * font_size if blocks else 0
+    return widest + 2 * padding, height + 2 * padding
+
+
+def element_box(obj: Dict[str, Any]) -> Tuple[float, float]:
+    """Estimated (width, height) the frontend will render an element at."""
+    kind = obj.get("type")
+    if kind == "image":
+        width = max(MIN_SIZE, _number(obj.get("width"), 350))
+        return width, max(0.0, _number(obj.get("height"), width * DEFAULT_IMAGE_ASPECT))
+    width = max(MIN_SIZE, _number(obj.get("width"), DEFAULT_WIDTH[kind]))
+    font_size = max(MIN_SIZE, _number(obj.get("fontSize"), DEFAULT_FONT_SIZE))
+    occupied, height = text_extent(str(obj.get("content") or ""), width, font_size, PADDING[kind])
+    # Cards paint their whole width; text is transparent past its longest line
+    return (width if kind == "card" else occupied), height
+
+
+class Skyline:
+    """The bottom of placed content as a step function of x: `bottoms[i]` holds on [xs[i], xs[i + 1])."""
+
+    def __init__(self):
+        self.xs: List[float] = [-math.inf]
+        self.bottoms: List[float] = [-math.inf]
+
+    def max_bottom(self, x0: float, x1: float) -> float:
+        return max(self.bottoms[bisect_right(self.xs, x0) - 1:bisect_left(self.xs, x1)], default=-math.inf)
+
+    def raise_to(self, x0: float, x1: float, bottom: float) -> None:
+        """Sets the bottom over [x0, x1), which must not be below `max_bottom(x0, x1)`."""
+        after = self.bottoms[bisect_right(self.xs, x1) - 1]
+        lo, hi = bisect_left(self.xs, x0), bisect_right(self.xs, x1)
+        self.xs[lo:hi] = [x0, x1]
+        self.bottoms[lo:hi] = [bottom, after]
+
+
+class CanvasLayout:
+    """Places the elements of one reply, in emission order. Lines and unknown types pass through."""
+
+    PLACED_TYPES = ("text", "card", "image")
+
+    def __init__(self):
+        self.skyline = Skyline()
+        self.moved = 0
+
+    def place(self, obj: Dict[str, Any]) -> Dict[str, Any]:
+        """Sets the element's x and y, in place, so it overlaps nothing placed before it."""
+        if obj.get("type") not in self.PLACED_TYPES:
+            return obj
+        x = max(MARGIN, _number(obj.get("x"), MARGIN))
+        y = max(MARGIN, _number(obj.get("y"), MARGIN))
+        width, height = element_box(obj)
+        top = max(y, self.skyline.max_bottom(x, x + width) + GAP)
+        self.skyline.raise_to(x, x + width, top + height)
+        if top != _number(obj.get("y"), None):
+            self.moved += 1
+        obj["x"], obj["y"] = round(x), round(top)
+        return obj
@@ -0,0 +1,182 @@
+import re
+import copy
+import asyncio
+import hashlib
+import logging
+import unicodedata
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from caching import TTLCache, SingleFlight
+from shared_loop import shared_loop
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " .,;:!?¡¿\"'"
+
+
+def normalize_prompt(text: str) -> str:
+    """Folds case, whitespace and surrounding punctuation so near-identical prompts share an entry."""
+    text = _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).casefold()
+    return text.strip(_EDGE_PUNCTUATION)
+
+
+def context_hash(*parts: str) -> str:
+    """Hash of everything besides the prompt that shapes a response (system prompt, documents, images)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(hashlib.sha256(part.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+def response_cache_key(model: str, temperature: float, prompt: str, context: str = "") -> str:
+    material = "\x00".join((model, repr(temperature), normalize_prompt(prompt), context))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class Uncacheable(Exception):
+    """
+    Raised by a stream after its last element when the response is usable but must not
+    be cached (e.g. it was cut off). Subscribers still get every element, without an error.
+    """
+
+
+class SharedGeneration:
+    """
+    One upstream streaming generation whose elements are replayed to every subscriber,
+    including ones that join after it started. It is cancelled once its last
+    subscriber leaves. Lives on the shared loop.
+    """
+
+    def __init__(self, elements: AsyncIterator[Dict[str, Any]]):
+        self.elements: List[Dict[str, Any]] = []
+        self.error: Optional[BaseException] = None
+        self.cacheable = True
+        self.subscribers = 1
+        self._changed = asyncio.Event()
+        self.task = asyncio.get_running_loop().create_task(self._run(elements))
+
+    async def _run(self, elements: AsyncIterator[Dict[str, Any]]) -> None:
+        try:
+            async for obj in elements:
+                self.elements.append(obj)
+                self._wake()
+        except Uncacheable as e:
+            self.cacheable = False
+            logger.info(f"Not caching generation: {e}")
+        except Exception as e:
+            self.error = e  # Re-raised to every subscriber by `next`
+        finally:
+            await elements.aclose()
+            self._wake()
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    @property
+    def succeeded(self) -> bool:
+        return self.task.done() and not self.task.cancelled() and self.error is None
+
+    async def next(self, index: int) -> Optional[Dict[str, Any]]:
+        """The element at `index`, waiting for it if needed; None once the stream is over."""
+        while index >= len(self.elements):
+            if self.task.done():
+                if self.task.cancelled():
+                    raise RuntimeError("The shared generation was cancelled.")
+                if self.error is not None:
+                    raise self.error
+                return None
+            await self._changed.wait()
+        return self.elements[index]
+
+
+class LLMResponseCache:
+    """
+    LLM responses by `response_cache_key`: an LRU of `max_entries` results kept for
+    `ttl` seconds, with identical concurrent requests coalesced into one upstream call.
+    A `max_entries` of 0 disables caching but keeps the coalescing. The cache and the
+    in-flight tables live on the shared I/O loop so that requests served on different
+    loops can share work.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl: float):
+        self.name = name
+        self._results = TTLCache(max_entries=max_entries, ttl=ttl)
+        self._single_flight = SingleFlight()
+        self._generations: Dict[str, SharedGeneration] = {}
+        self.coalesced_streams = 0
+
+    async def get_or_create(self, key: str, create: Callable[[], Awaitable[Any]]) -> Any:
+        """Returns the cached response for `key`, or awaits `create()` (once) and caches it."""
+        return await shared_loop.run(self._get_or_create(key, create))
+
+    async def _get_or_create(self, key: str, create: Callable[[], Awaitable[Any]]) -> Any:
+        result = self._results.get(key)
+        if result is not None:
+            logger.info(f"{self.name} cache hit for {key[:12]}.")
+            return result
+        return await self._single_flight.do(key, lambda: self._create_and_cache(key, create))
+
+    async def _create_and_cache(self, key: str, create: Callable[[], Awaitable[Any]]) -> Any:
+        result = await create()
+        self._results.set(key, result)
+        return result
+
+    async def stream(self, key: str, start: Callable[[], AsyncIterator[Dict[str, Any]]]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields the elements of the response for `key`: replayed from the cache, shared
+        with an identical generation already in flight, or from a new `start()` stream.
+        Only generations that finish without error, yield at least one element and don't
+        end with `Uncacheable` are cached. Every subscriber gets
+        its own copies, so callers may mutate what they receive.
+        """
+        cached = self._results.get(key)
+        if cached is not None:
+            logger.info(f"{self.name} cache hit for {key[:12]}, replaying {len(cached)} elements.")
+            for obj in cached:
+                yield copy.deepcopy(obj)
+            return
+
+        generation = await shared_loop.run(self._join(key, start))
+        try:
+            index = 0
+            while (obj := await shared_loop.run(generation.next(index))) is not None:
+                yield copy.deepcopy(obj)
+                index += 1
+        finally:
+            shared_loop.loop.call_soon_threadsafe(self._leave, key, generation)
+
+    async def _join(self, key: str, start: Callable[[], AsyncIterator[Dict[str, Any]]]) -> SharedGeneration:
+        generation = self._generations.get(key)
+        if generation is not None:
+            generation.subscribers += 1
+            self.coalesced_streams += 1
+            logger.info(f"{self.name} joined in-flight generation {key[:12]} ({generation.subscribers} subscribers).")
+            return generation
+        generation = SharedGeneration(start())
+        self._generations[key] = generation
+        generation.task.add_done_callback(lambda task: self._finish(key, generation))
+        return generation
+
+    def _finish(self, key: str, generation: SharedGeneration) -> None:
+        if self._generations.get(key) is generation:
+            del self._generations[key]
+        if generation.succeeded and generation.cacheable and generation.elements:
+            self._results.set(key, generation.elements)
+
+    def _leave(self, key: str, generation: SharedGeneration) -> None:
+        generation.subscribers -= 1
+        if generation.subscribers <= 0 and not generation.task.done():
+            # Nobody is listening any more: stop the upstream generation and make sure
+            # later requests start a fresh one rather than joining a cancelled stream.
+            if self._generations.get(key) is generation:
+                del self._generations[key]
+            generation.task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self._results.stats(),
+            "coalesced": self._single_flight.coalesced + self.coalesced_streams,
+            "in_flight_streams": len(self._generations),
+        }
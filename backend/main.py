@@ -1,19 +1,40 @@
 import io
 import os
+import re
+import time
+import queue
+import asyncio
+import threading
+import multiprocessing
+import uuid
 import base64
 import wave
-import fitz  # PyMuPDF
 import logging
 import json
 import httpx
 import anyio
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
 
-from flask import Flask, request, jsonify, Response, abort
+from flask import Flask, request, jsonify, Response, abort, send_file
 from flask_cors import CORS
 from openai import AsyncOpenAI
-from piper import PiperVoice
+from tts_pool import TTSExecutor, TTSPoolSaturated
+from audio_cache import NarrationAudioCache, model_file_hash
+from audio_encoding import AUDIO_FORMATS, encode_audio, audio_mime_type, audio_extension
+from image_search import UnsplashSearch
+from json_stream import JSONObjectStream
+from layout import CanvasLayout
+from pdf_context import PdfIndex, build_pdf_index
+from pdf_cache import PdfIndexCache
+from image_prep import ImagePreprocessor
+from voices import VoiceRegistry, discover_voices
+from session_store import create_session_store
+from llm_cache import LLMResponseCache, Uncacheable, context_hash, response_cache_key
+from transcription import ChunkedTranscriber
+from uploads import remove_stale_uploads, spooling_request_class, upload_path, upload_sha256
+import metrics
+from metrics import span, start_trace
 
 # --- CONFIGURATION & INITIALIZATION ---
 
@@ -24,7 +45,8 @@ dotenv_path = Path(__file__).parent / ".env"
 load_dotenv(dotenv_path=dotenv_path)
 
 # Set up logging
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
 # Load API keys and base URLs from environment
@@ -33,18 +55,83 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") # For Whisper transcription
 RUNPOD_API_KEY = os.getenv("RUNPOD_API_KEY")
 BASE_URL_3 = os.getenv("BASE_URL_3")
 BASE_URL_3N = os.getenv("BASE_URL_3N")
+UNSPLASH_SEARCH_URL = os.getenv("UNSPLASH_SEARCH_URL", "https://api.unsplash.com/search/photos")
 
 # --- Constants ---
 UPLOADS_DIR = Path("uploads")
 UPLOADS_DIR.mkdir(exist_ok=True)
-PDF_MAX_WORDS = 2000  # Process up to the first 10,000 words of a PDF
+UPLOADS_SPOOL_DIR = Path(os.getenv("UPLOADS_SPOOL_DIR", str(UPLOADS_DIR / "incoming")))  # Uploads while a request runs
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(128 * 1024 * 1024)))
+MAX_AUDIO_UPLOAD_BYTES = int(os.getenv("MAX_AUDIO_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+MAX_PDF_UPLOAD_BYTES = int(os.getenv("MAX_PDF_UPLOAD_BYTES", str(64 * 1024 * 1024)))
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", str(16 * 1024 * 1024)))  # Per image
+PDF_MAX_WORDS = 2000  # Word budget for the PDF passages sent to the refinement model
+PDF_TOP_K = int(os.getenv("PDF_TOP_K", "10"))  # Most relevant passages considered for that budget
+PDF_CHUNK_WORDS = int(os.getenv("PDF_CHUNK_WORDS", "200"))
+PDF_CHUNK_OVERLAP_WORDS = int(os.getenv("PDF_CHUNK_OVERLAP_WORDS", "40"))
+PDF_INDEX_MAX_PAGES = int(os.getenv("PDF_INDEX_MAX_PAGES", "500"))  # Pages past this are never extracted
+PDF_CACHE_DIR = Path(os.getenv("PDF_CACHE_DIR", str(UPLOADS_DIR / "pdf_cache")))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))  # Longest edge of context images sent to the LLM
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "jpeg")  # "jpeg" or "webp"
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+IMAGE_PREP_WORKERS = int(os.getenv("IMAGE_PREP_WORKERS", "4"))
+TRANSCRIPTION_CHUNK_SECONDS = float(os.getenv("TRANSCRIPTION_CHUNK_SECONDS", "30"))  # 0 sends every recording whole
+TRANSCRIPTION_OVERLAP_SECONDS = float(os.getenv("TRANSCRIPTION_OVERLAP_SECONDS", "1.0"))  # For cuts that miss a silence
+TRANSCRIPTION_MAX_CONCURRENCY = int(os.getenv("TRANSCRIPTION_MAX_CONCURRENCY", "4"))  # Chunk requests in flight per process
 LLM_MAX_TOKENS_JSON = 4096
 LLM_MAX_TOKENS_PROMPT = 256
+REFINEMENT_MODEL, REFINEMENT_TEMPERATURE = "gemma3", 0.2
+LAYOUT_MODEL, LAYOUT_TEMPERATURE = "gemma3n", 0.7
+REFINEMENT_CACHE_SIZE = int(os.getenv("REFINEMENT_CACHE_SIZE", "1024"))  # 0 disables caching, keeps coalescing
+REFINEMENT_CACHE_TTL = float(os.getenv("REFINEMENT_CACHE_TTL", "3600"))
+LAYOUT_CACHE_SIZE = int(os.getenv("LAYOUT_CACHE_SIZE", "256"))  # 0 disables caching, keeps coalescing
+LAYOUT_CACHE_TTL = float(os.getenv("LAYOUT_CACHE_TTL", "3600"))
+LAYOUT_REFLOW = os.getenv("LAYOUT_REFLOW", "1") == "1"  # Move elements down so none overlap; 0 keeps the model's positions
+REPLY_MAX_INFLIGHT_ELEMENTS = max(1, int(os.getenv("REPLY_MAX_INFLIGHT_ELEMENTS", "4")))  # Elements enriched concurrently per reply
+REPLY_STREAM_BUFFER = int(os.getenv("REPLY_STREAM_BUFFER", "8"))  # SSE events buffered per WSGI reply stream
+TTS_POOL_WORKERS = int(os.getenv("TTS_POOL_WORKERS", "2"))  # 0 synthesizes in-process on a thread instead
+TTS_POOL_MAX_QUEUE = int(os.getenv("TTS_POOL_MAX_QUEUE", "16"))  # Jobs in flight before narration is skipped
+TTS_JOB_TIMEOUT_SECONDS = float(os.getenv("TTS_JOB_TIMEOUT_SECONDS", "30"))
+PRELOAD_VOICES = os.getenv("PRELOAD_VOICES", "en_US")  # Comma-separated languages loaded at startup, or "all"
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+AUDIO_CACHE_DISK = os.getenv("AUDIO_CACHE_DISK", "0") == "1"  # Persist cached narrations across restarts
+AUDIO_CACHE_DIR = Path(os.getenv("AUDIO_CACHE_DIR", str(UPLOADS_DIR / "audio_cache")))
+AUDIO_CACHE_DISK_MAX_BYTES = int(os.getenv("AUDIO_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+AUDIO_DELIVERY = os.getenv("AUDIO_DELIVERY", "url")  # "url": events carry audioUrl; "inline": audioDataUrl
+AUDIO_FORMAT = os.getenv("AUDIO_FORMAT", "mp3")  # One of audio_encoding.AUDIO_FORMATS
+if AUDIO_DELIVERY not in ("url", "inline"):
+    raise ValueError(f"AUDIO_DELIVERY must be 'url' or 'inline', not '{AUDIO_DELIVERY}'.")
+if AUDIO_FORMAT not in AUDIO_FORMATS:
+    raise ValueError(f"AUDIO_FORMAT must be one of {sorted(AUDIO_FORMATS)}, not '{AUDIO_FORMAT}'.")
+AUDIO_ID_RE = re.compile(r"[0-9a-f]{64}")  # Narration audio ids are SHA-256 cache keys
+NARRATION_STREAMING = os.getenv("NARRATION_STREAMING", "0") == "1"  # Send narration audio sentence by sentence
+NARRATION_MIN_SENTENCE_CHARS = 40  # Shorter sentences are merged into the next to avoid choppy audio
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+")
+IMAGE_SEARCH_CACHE_TTL = float(os.getenv("IMAGE_SEARCH_CACHE_TTL", "86400"))
+IMAGE_SEARCH_NEGATIVE_TTL = float(os.getenv("IMAGE_SEARCH_NEGATIVE_TTL", "3600"))  # For queries with no results
+IMAGE_SEARCH_CACHE_SIZE = int(os.getenv("IMAGE_SEARCH_CACHE_SIZE", "2048"))
+DEFAULT_LANGUAGE = "en_US"  # TTS language of sessions that never called /api/set-language
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")  # "memory" (per process) or "sqlite" (shared by workers)
+SESSION_DB_PATH = Path(os.getenv("SESSION_DB_PATH", str(UPLOADS_DIR / "sessions.sqlite3")))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "86400"))  # Since the session was last written
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))  # Memory store only
 
 # --- GLOBAL STATE & MODEL LOADING ---
 
-# In-memory store for the current TTS language
-current_language = {"lang": "en_US"}
+# Per-session state by session_id: TTS language, registered document, last refined prompt
+session_store = create_session_store(
+    SESSION_STORE, max_entries=SESSION_MAX_ENTRIES, ttl=SESSION_TTL_SECONDS, db_path=SESSION_DB_PATH
+)
+
+def session_language(session_id: str) -> str:
+    return session_store.get(session_id).get("lang", DEFAULT_LANGUAGE)
+
+# Extracted PDF chunks and their BM25 index, keyed by document hash
+pdf_index_cache = PdfIndexCache(
+    PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES,
+    params={"max_pages": PDF_INDEX_MAX_PAGES, "chunk_words": PDF_CHUNK_WORDS, "overlap_words": PDF_CHUNK_OVERLAP_WORDS},
+)
 
 # Initialize API Clients
 logger.info("Initializing API clients...")
@@ -55,39 +142,122 @@ if not OPENAI_API_KEY:
     logger.warning("OPENAI_API_KEY not found. Audio transcription will fail.")
 openai_client = AsyncOpenAI()
 
+async def whisper_transcribe(file) -> str:
+    transcription = await openai_client.audio.transcriptions.create(model="whisper-1", file=file)
+    return transcription.text
+
+# Long recordings are split at silences and their chunks transcribed concurrently
+audio_transcriber = ChunkedTranscriber(
+    whisper_transcribe, chunk_seconds=TRANSCRIPTION_CHUNK_SECONDS, overlap_seconds=TRANSCRIPTION_OVERLAP_SECONDS,
+    max_concurrency=TRANSCRIPTION_MAX_CONCURRENCY,
+)
+
 # Client for the first LLM step (prompt refinement) using RunPod
 client_refinement = AsyncOpenAI(base_url=BASE_URL_3, api_key=RUNPOD_API_KEY)
 
 # Client for the second LLM step (JSON generation) using RunPod
 client_generation = AsyncOpenAI(base_url=BASE_URL_3N, api_key=RUNPOD_API_KEY)
 
+# Pooled, cached Unsplash search shared by every request
+unsplash_search = UnsplashSearch(
+    UNSPLASH_API_KEY, UNSPLASH_SEARCH_URL,
+    ttl=IMAGE_SEARCH_CACHE_TTL, negative_ttl=IMAGE_SEARCH_NEGATIVE_TTL, max_entries=IMAGE_SEARCH_CACHE_SIZE,
+)
+
 logger.info("API clients initialized.")
 
+# Refined prompts and generated layouts, with identical in-flight requests sharing one upstream call
+refinement_cache = LLMResponseCache("Refinement", max_entries=REFINEMENT_CACHE_SIZE, ttl=REFINEMENT_CACHE_TTL)
+layout_cache = LLMResponseCache("Layout", max_entries=LAYOUT_CACHE_SIZE, ttl=LAYOUT_CACHE_TTL)
+
+
+# Downscales and re-encodes context images before they are base64-embedded
+image_preprocessor = ImagePreprocessor(IMAGE_MAX_EDGE, IMAGE_FORMAT, IMAGE_QUALITY, workers=IMAGE_PREP_WORKERS)
+
 
 # --- TTS VOICE LOADING ---
 BASE_DIR = Path(__file__).parent.resolve()
-VOICE_MODEL_PATHS = {
-    "en_US": str(BASE_DIR / "voices/en_US-lessac-medium.onnx"),
-    "es_ES": str(BASE_DIR / "voices/es_ES-sharvard-medium.onnx"),
-}
-voice_cache = {}
+VOICE_MODEL_PATHS = discover_voices(BASE_DIR / "voices")
+PRELOAD_LANGS = list(VOICE_MODEL_PATHS) if PRELOAD_VOICES == "all" else [
+    lang.strip() for lang in PRELOAD_VOICES.split(",") if lang.strip()
+]
+
+# Voices for in-process synthesis (TTS_POOL_WORKERS=0); pool workers keep a registry of their own
+voice_registry = VoiceRegistry(VOICE_MODEL_PATHS)
 
 def get_voice_for_lang(lang: str):
     """Returns a PiperVoice instance for the given language, loading if necessary."""
-    if lang not in VOICE_MODEL_PATHS:
+    if lang not in voice_registry:
         abort(400, description=f"Unsupported language: {lang}")
-    if lang not in voice_cache:
-        try:
-            model_path = VOICE_MODEL_PATHS[lang]
-            if not Path(model_path).exists():
-                 logger.error(f"Voice model file not found at path: {model_path}")
-                 abort(500, description=f"TTS model file not found for language '{lang}'.")
-            voice_cache[lang] = PiperVoice.load(model_path)
-            logging.info(f"PiperVoice loaded for lang '{lang}' from {model_path}")
-        except Exception as e:
-            logging.error(f"Failed to load PiperVoice for lang '{lang}': {e}")
-            abort(500, description=f"TTS model could not be loaded for language '{lang}'.")
-    return voice_cache[lang]
+    try:
+        return voice_registry.get(lang)
+    except FileNotFoundError as e:
+        logger.error(str(e))
+        abort(500, description=f"TTS model file not found for language '{lang}'.")
+    except Exception as e:
+        logger.error(f"Failed to load PiperVoice for lang '{lang}': {e}")
+        abort(500, description=f"TTS model could not be loaded for language '{lang}'.")
+
+
+# Out-of-process synthesis; each worker loads and warms up PRELOAD_LANGS once, other voices on first use
+tts_executor = TTSExecutor(
+    VOICE_MODEL_PATHS, workers=TTS_POOL_WORKERS, max_queue=TTS_POOL_MAX_QUEUE, timeout=TTS_JOB_TIMEOUT_SECONDS,
+    preload=PRELOAD_LANGS,
+)
+
+def preload_voices() -> None:
+    """Loads and warms up PRELOAD_LANGS in the background so no reply pays for it."""
+    if tts_executor.enabled:
+        tts_executor.start()
+    else:
+        threading.Thread(
+            target=voice_registry.preload, args=(PRELOAD_LANGS,), name="voice-preload", daemon=True
+        ).start()
+
+# Spawned TTS workers re-import this module and must not start pools or loaders of their own
+if multiprocessing.parent_process() is None:
+    preload_voices()
+
+# Synthesized narrations keyed by (language, voice model hash, normalized text)
+# URL delivery always uses the disk tier: /api/audio may be served by another worker,
+# or after the clip left (or never fit in) this process's memory tier
+narration_audio_cache = NarrationAudioCache(
+    max_bytes=AUDIO_CACHE_MAX_BYTES,
+    disk_dir=AUDIO_CACHE_DIR if AUDIO_CACHE_DISK or AUDIO_DELIVERY == "url" else None,
+    disk_max_bytes=AUDIO_CACHE_DISK_MAX_BYTES,
+)
+
+
+# --- METRICS ---
+TTS_AUDIO_SECONDS = metrics.counter("tts_audio_seconds_total", "Seconds of narration audio synthesized.", ("lang",))
+REPLY_BYTES_STREAMED = metrics.counter("reply_bytes_streamed_total", "Bytes of server-sent events sent by /api/reply.")
+REPLY_EVENTS = metrics.counter("reply_events_total", "Server-sent events sent by /api/reply.", ("kind",))
+LAYOUT_PARSE_FAILURES = metrics.counter(
+    "layout_parse_failures_total", "Layout objects discarded from the model's stream.", ("reason",)
+)
+
+def cache_metrics() -> List[metrics.Sample]:
+    """Hit and miss counts of every cache, read from the caches at scrape time."""
+    caches = {
+        "narration_audio": narration_audio_cache.stats(),
+        "image_search": unsplash_search.cache.stats(),
+        "pdf_index": pdf_index_cache.stats(),
+        "refinement": refinement_cache.stats(),
+        "layout": layout_cache.stats(),
+    }
+    samples = []
+    for cache, stats in caches.items():
+        labels = {"cache": cache}
+        samples.append(("cache_hits_total", "counter", "Lookups answered from a cache.", labels,
+                        stats["hits"] + stats.get("disk_hits", 0)))
+        samples.append(("cache_misses_total", "counter", "Lookups that missed a cache.", labels, stats["misses"]))
+        if "coalesced" in stats:
+            samples.append(("cache_coalesced_total", "counter", "Misses that joined an identical in-flight request.",
+                            labels, stats["coalesced"]))
+    samples.append(("tts_jobs_in_flight", "gauge", "Narrations queued or running in the TTS pool.", {}, tts_executor.in_flight))
+    return samples
+
+metrics.register_collector(cache_metrics)
 
 
 # --- IMPROVED PROMPT TEMPLATES ---
@@ -135,7 +305,7 @@ You are TutorLM, an expert visual educator specializing in creating effective ed
      "type": "text",
      "content": "Clear title with **emphasis** or $LaTeX$ formulas",
      "fontSize": 18-32,
-     "x": position, "y": position (use increments of 80-100px for proper spacing),
+     "x": position, "y": position,
      "textColor": "#000000",
      "speakAloud": "Clear narration explaining this concept"
    }
@@ -145,7 +315,7 @@ You are TutorLM, an expert visual educator specializing in creating effective ed
      "type": "card",
      "content": "Structured content with markdown formatting and $LaTeX$ when needed",
      "fontSize": 14-18,
-     "x": position, "y": position (ensure 100-120px gaps between cards),
+     "x": position, "y": position,
      "width": 300-400,
      "backgroundColor": "#F8F9FA", "#E3F2FD", "#E8F5E8", "#FFF3E0", "#F3E5F5", "#FCE4EC", "#E0F2F1", "#FFF8E1", "#FFEBEE", "#E1F5FE", "#F1F8E9", "#FFF9C4", "#EFEBE9", "#FAFAFA", "#FFFFFF",
      "speakAloud": "Detailed explanation of the card's educational content"
@@ -155,7 +325,7 @@ You are TutorLM, an expert visual educator specializing in creating effective ed
    {
      "type": "image",
      "search": "specific, educational search term (e.g., 'mitochondria diagram', 'water cycle illustration', 'DNA double helix structure')",
-     "x": position, "y": position (account for image height + 20px margin),
+     "x": position, "y": position,
      "width": 150-300,
      "speakAloud": "Explanation of how this image relates to and enhances the learning concept"
    }
@@ -164,14 +334,9 @@ You are TutorLM, an expert visual educator specializing in creating effective ed
 - DO NOT USE images for mathematical explanations, abstract concepts, general topics, or decorative purposes.
 
 **LAYOUT STRATEGY**:
-- Create logical visual flow from general to specific concepts
-- **CRITICAL**: Ensure NO vertical overlapping - each element needs sufficient vertical spacing
-- Text elements: minimum 60px vertical separation
-- Card elements: minimum 80px vertical separation (cards are typically 60-100px tall)
-- Images: minimum 100px vertical separation (account for image height + margins)
-- Use a grid-like approach: place elements at y-coordinates like 50, 150, 250, 350, etc.
+- Order elements top to bottom, from general to specific concepts; spacing is adjusted for you
+- Elements side by side share a y and use separate x ranges
 - Balance text-heavy cards with strategic visual elements
-- Consider element heights when positioning: text ~40px, cards ~80-120px, images variable
 - Ensure content is educational and purposeful
 
 Your response must be a valid JSON array starting with `[` and ending with `]`, containing 4-8 thoughtfully designed elements.
@@ -181,66 +346,389 @@ Your response must be a valid JSON array starting with `[` and ending with `]`,
 
 async def search_for_image_on_unsplash(q: str) -> Dict[str, Any]:
     """Searches for an image on Unsplash and returns a dictionary with its details."""
-    logging.info(f"Performing Unsplash search for query: '{q}'")
+    logger.debug(f"Performing Unsplash search for query: '{q}'")
     if not UNSPLASH_API_KEY:
         logging.error("UNSPLASH_API_KEY is not set. Cannot perform image search.")
         raise ConnectionError("Image search is not configured on the server (missing API key).")
     if not q:
         raise ValueError("Search query cannot be empty.")
 
-    url = "https://api.unsplash.com/search/photos"
-    headers = {"Authorization": f"Client-ID {UNSPLASH_API_KEY}", "Accept-Version": "v1"}
-    params = {"query": q, "per_page": 1}
+    with span("image_search"):
+        image_data = await unsplash_search.search(q)
+    if image_data is None:
+        raise FileNotFoundError(f"No images found for '{q}'")
+    return image_data
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, headers=headers, params=params)
-        response.raise_for_status()
 
-    data = response.json()
-    if not data.get("results"):
-        raise FileNotFoundError(f"No images found for '{q}'")
+async def attach_image_to_element(obj: Dict[str, Any]) -> None:
+    """Resolves an image element's search term into a concrete Unsplash image, in place."""
+    if obj.get("type") != "image" or not obj.get("search"):
+        return
+    try:
+        image_data = await search_for_image_on_unsplash(obj["search"])
+        aspect_ratio = image_data["height"] / image_data["width"] if image_data["width"] > 0 else 1
+        final_width = obj.get("width") if isinstance(obj.get("width"), int) else 350
+        obj.update({
+            "imageUrl": image_data["imageUrl"],
+            "width": final_width,
+            "height": int(final_width * aspect_ratio)
+        })
+    except Exception as search_error:
+        logger.error(f"Image search failed: {search_error}")
+        obj.update({
+            "type": "text",
+            "content": f"**Error:** Could not find image for '{obj['search']}'",
+            "textColor": "#ef4444"
+        })
+
+
+def synthesize_wav_bytes(voice, text: str) -> bytes:
+    """Renders narration text to an in-memory WAV file."""
+    with io.BytesIO() as wav_buffer:
+        with wave.open(wav_buffer, "wb") as wav_file:
+            voice.synthesize_wav(text, wav_file)
+        return wav_buffer.getvalue()
+
+
+def wav_duration_seconds(wav_bytes: bytes) -> float:
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wav_file:
+        return wav_file.getnframes() / wav_file.getframerate()
+
 
-    first_image = data["results"][0]
-    image_url = first_image.get("urls", {}).get("regular")
-    if not image_url:
-        raise ValueError("Unsplash API returned incomplete image data.")
+async def render_narration(text: str, voice, lang: str) -> Tuple[str, bytes, bool]:
+    """
+    Returns (audio id, audio bytes in AUDIO_FORMAT, whether /api/audio can serve the id)
+    for a narration, synthesizing and encoding only on a cache miss. The id is the
+    content-addressed cache key.
+    """
+    # Hashing the model file is a one-off per language, but it is still kept off the event loop
+    model_hash = await anyio.to_thread.run_sync(model_file_hash, VOICE_MODEL_PATHS.get(lang, ""))
+    cache_key = NarrationAudioCache.key(lang, model_hash, text, AUDIO_FORMAT)
+    # The cache's disk tier reads, writes and evicts files, so it is kept off the event loop too
+    audio_bytes = await anyio.to_thread.run_sync(narration_audio_cache.get, cache_key)
+    if audio_bytes is not None:
+        return cache_key, audio_bytes, True
+    with span("tts_synthesis"):
+        if tts_executor.enabled:
+            wav_bytes = await tts_executor.synthesize(text, lang)
+        else:
+            wav_bytes = await anyio.to_thread.run_sync(synthesize_wav_bytes, voice, text)
+    TTS_AUDIO_SECONDS.inc(wav_duration_seconds(wav_bytes), lang=lang)
+    with span("audio_encoding"):
+        audio_bytes = await anyio.to_thread.run_sync(encode_audio, wav_bytes, AUDIO_FORMAT)
+    stored = await anyio.to_thread.run_sync(narration_audio_cache.put, cache_key, audio_bytes)
+    return cache_key, audio_bytes, stored
 
-    return {"imageUrl": image_url, "width": first_image.get("width"), "height": first_image.get("height")}
 
+async def narration_audio_fields(text: str, voice, lang: str) -> Dict[str, Any]:
+    """
+    Synthesizes narration off the event loop and returns the fields that deliver it:
+    a short `audioUrl` served by /api/audio, or an inline `audioDataUrl` (also used in
+    URL mode when the audio could not be stored). Any failure degrades to `audioDataUrl: None`.
+    """
+    try:
+        audio_id, audio_bytes, stored = await render_narration(text, voice, lang)
+    except TTSPoolSaturated as saturated:
+        logger.warning(f"Skipping narration audio: {saturated}")
+        return {"audioDataUrl": None}
+    except Exception as tts_error:
+        logger.error(f"Error generating TTS audio: {tts_error!r}")
+        return {"audioDataUrl": None}
+    if AUDIO_DELIVERY == "url" and stored:
+        return {"audioUrl": f"/api/audio/{audio_id}.{audio_extension(AUDIO_FORMAT)}"}
+    base64_audio = base64.b64encode(audio_bytes).decode('utf-8')
+    return {"audioDataUrl": f"data:{audio_mime_type(AUDIO_FORMAT)};base64,{base64_audio}"}
+
+
+async def attach_narration_audio(obj: Dict[str, Any], voice, lang: str) -> None:
+    """Synthesizes the element's whole `speakAloud` text and attaches it to the element."""
+    narration_text = obj.get("speakAloud")
+    if not isinstance(narration_text, str) or not narration_text.strip() or not (voice or tts_executor.enabled):
+        return
+    obj.update(await narration_audio_fields(narration_text, voice, lang))
+
+
+def split_sentences(text: str) -> List[str]:
+    """Splits narration into sentences, folding very short ones into the next."""
+    sentences: List[str] = []
+    for part in _SENTENCE_END_RE.split(text.strip()):
+        if sentences and len(sentences[-1]) < NARRATION_MIN_SENTENCE_CHARS:
+            sentences[-1] = f"{sentences[-1]} {part}"
+        elif part:
+            sentences.append(part)
+    return sentences
+
+
+async def stream_narration(sentences: List[str], voice, lang: str, chunks: asyncio.Queue) -> None:
+    """Synthesizes sentences in order, publishing each one's audio fields as soon as it is ready."""
+    for sentence in sentences:
+        chunks.put_nowait(await narration_audio_fields(sentence, voice, lang))
+
+
+async def enrich_element(obj: Dict[str, Any], voice, lang: str) -> Tuple[Dict[str, Any], Optional[Tuple[asyncio.Queue, asyncio.Task]]]:
+    """
+    Runs the image lookup and narration synthesis for one element concurrently.
 
-def image_to_base64_data_url(file_content: bytes, filename: str) -> str:
-    """Converts an image file's content to a base64 data URL."""
+    In streaming narration mode the element is returned as soon as its image is
+    resolved, tagged with `narrationId`/`narrationChunks`, together with a queue that
+    receives the audio of each sentence in order and the task filling it.
+    """
+    narration_text = obj.get("speakAloud")
+    # Anything but non-blank text (the model sometimes emits lists or numbers) takes the
+    # whole-element path, which leaves it unnarrated instead of failing the reply
+    sentences = split_sentences(narration_text) if isinstance(narration_text, str) else []
+    if not (NARRATION_STREAMING and sentences and (voice or tts_executor.enabled)):
+        await asyncio.gather(attach_image_to_element(obj), attach_narration_audio(obj, voice, lang))
+        return obj, None
+
+    chunks: asyncio.Queue = asyncio.Queue()
+    narration_task = asyncio.create_task(stream_narration(sentences, voice, lang, chunks))
+    try:
+        await attach_image_to_element(obj)
+    except BaseException:
+        narration_task.cancel()
+        raise
+    obj.update({"narrationId": uuid.uuid4().hex, "narrationChunks": len(sentences)})
+    return obj, (chunks, narration_task)
+
+
+def cancel_enrichment(task: asyncio.Task) -> None:
+    """Cancels an element's enrichment, including narration it may already have started."""
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled() and task.exception() is None:
+        _, narration = task.result()
+        if narration:
+            narration[1].cancel()
+
+
+def index_pdf(pdf_file) -> Tuple[str, PdfIndex]:
+    """Returns (document_id, index) for an uploaded PDF, reusing the cached extraction when possible."""
+    pdf_path = upload_path(pdf_file)
+    return pdf_index_cache.get_or_build(
+        upload_sha256(pdf_file),
+        lambda: build_pdf_index(pdf_path, PDF_INDEX_MAX_PAGES, PDF_CHUNK_WORDS, PDF_CHUNK_OVERLAP_WORDS),
+    )
+
+
+def load_pdf_index(pdf_file, document_id: Optional[str]) -> Tuple[Optional[str], Optional[PdfIndex]]:
+    """
+    Indexes an uploaded PDF, or loads a previously registered one by id. Returns
+    (None, None) when neither is usable, so the prompt is refined without it.
+    """
     try:
-        ext = Path(filename).suffix.lstrip('.').lower()
-        if ext == "jpg": ext = "jpeg"
-        encoded_string = base64.b64encode(file_content).decode()
-        return f"data:image/{ext};base64,{encoded_string}"
+        if pdf_file:
+            logger.info(f"Processing PDF: {pdf_file.filename}")
+            return index_pdf(pdf_file)
+        pdf_index = pdf_index_cache.load(document_id)
+        if pdf_index is None:
+            logger.warning(f"Document '{document_id}' is not cached; proceeding without it.")
+            return None, None
+        return document_id, pdf_index
     except Exception as e:
-        logger.error(f"Error converting image {filename} to base64: {e}")
-        return ""
+        logger.error(f"Failed to process PDF context: {e}", exc_info=True)
+        return None, None
+
+
+def prepare_context_images(image_files) -> List[str]:
+    """Downscales and re-encodes uploaded context images, returning their data URLs."""
+    uploads = [(upload_path(img_file), img_file.filename) for img_file in image_files]
+    image_urls, savings = image_preprocessor.prepare_all(uploads)
+    logger.info(
+        f"Loaded {len(image_urls)} images for context: {savings['original_bytes']} -> "
+        f"{savings['encoded_bytes']} bytes ({savings['saved_bytes']} saved)."
+    )
+    return image_urls
+
+
+async def timed(stage: str, awaitable):
+    """Awaits `awaitable` inside a `span(stage)`."""
+    with span(stage):
+        return await awaitable
 
 
-async def transcribe_audio(audio_file_stream, audio_filename: str) -> str:
-    """Transcribes audio using the OpenAI Whisper API."""
+def trace_requested() -> bool:
+    """Clients opt into a per-request timing breakdown with `X-Trace: 1` (or `?trace=1`, for EventSource)."""
+    return request.headers.get("X-Trace") == "1" or request.args.get("trace") == "1"
+
+
+async def transcribe_audio(audio_path: Path, audio_filename: str) -> str:
+    """Transcribes an audio file using the OpenAI Whisper API, in concurrent chunks when it is long."""
     logger.info(f"Transcribing audio file: {audio_filename} using OpenAI API")
     if not OPENAI_API_KEY:
         abort(501, description="Audio transcription service is not configured.")
     try:
-        transcription = await openai_client.audio.transcriptions.create(
-            model="whisper-1",
-            file=(audio_filename, audio_file_stream.read()),
-        )
+        with span("transcription"):
+            text = await audio_transcriber.transcribe(audio_path, audio_filename)
         logger.info(f"OpenAI transcription successful for {audio_filename}.")
-        return transcription.text
+        return text
     except Exception as e:
         logger.error(f"OpenAI transcription failed: {e}", exc_info=True)
         abort(500, description="Audio transcription failed.")
 
 
+async def generate_layout(refined_prompt: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams the canvas elements of a new layout from the generation model as they are
+    parsed. Empty, truncated or partly malformed layouts end with `Uncacheable`, so a
+    retry asks the model again instead of replaying them.
+    """
+    messages = [
+        {"role": "system", "content": JSON_GENERATION_SYSTEM_PROMPT},
+        {"role": "user", "content": refined_prompt}
+    ]
+    started = time.perf_counter()
+    response_stream = await client_generation.chat.completions.create(
+        model=LAYOUT_MODEL, messages=messages, max_tokens=LLM_MAX_TOKENS_JSON, temperature=LAYOUT_TEMPERATURE, stream=True
+    )
+    parser = JSONObjectStream()
+    first_token, parse_seconds = None, 0.0
+    try:
+        async for chunk in response_stream:
+            delta = chunk.choices[0].delta.content
+            if not delta: continue
+            if first_token is None:
+                first_token = time.perf_counter()
+                metrics.observe("llm_first_token", first_token - started)
+            parse_started = time.perf_counter()
+            objects = parser.feed(delta)
+            parse_seconds += time.perf_counter() - parse_started
+            for obj in objects:
+                yield obj
+        parser.close()
+        metrics.observe("llm_stream", time.perf_counter() - started)
+        metrics.observe("json_parse", parse_seconds)
+        logger.info(f"Parsed layout stream: {parser.stats()}")
+        # close() counts an unfinished trailing object among the parse failures
+        if parser.parse_failures > parser.truncated:
+            LAYOUT_PARSE_FAILURES.inc(parser.parse_failures - parser.truncated, reason="malformed")
+        if parser.truncated:
+            LAYOUT_PARSE_FAILURES.inc(reason="truncated")
+        if parser.truncated or parser.parse_failures or not parser.objects_parsed:
+            raise Uncacheable(f"incomplete layout {parser.stats()}")
+    finally:
+        await response_stream.close()
+
+
+async def generate_reply_events(refined_prompt: str, session_id: str, lang: str, trace: bool = False) -> AsyncIterator[str]:
+    """
+    Yields the SSE payloads for one reply: one `data:` event per canvas element, in the
+    order the model produced them, followed by `[DONE]` (or an error event). With
+    NARRATION_STREAMING, each element is followed by `{"narration": {...}}` events
+    carrying its audio one sentence at a time.
+    Layouts come from `layout_cache`, so repeated prompts are replayed and identical
+    concurrent replies share one LLM stream; enrichment always runs per reply.
+    Closing the generator cancels pending enrichment, and the upstream LLM stream
+    once no other reply is reading it. With LAYOUT_REFLOW, each element is placed by a
+    `CanvasLayout` just before it is sent, once its image size is known. With `trace`, a `{"trace": {...}}` event with
+    the per-stage timings precedes `[DONE]`.
+    """
+    reply_trace = start_trace()
+
+    def event(payload: str, kind: str) -> str:
+        data = f"data: {payload}\n\n"
+        REPLY_EVENTS.inc(kind=kind)
+        REPLY_BYTES_STREAMED.inc(len(data.encode("utf-8")))
+        return data
+
+    try:
+        if tts_executor.enabled:
+            if lang not in VOICE_MODEL_PATHS:
+                abort(400, description=f"Unsupported language: {lang}")
+            voice = None
+        else:
+            # Loading a voice (or waiting for its preload) blocks, so it is kept off the event loop
+            voice = await anyio.to_thread.run_sync(get_voice_for_lang, lang)
+
+        cache_key = response_cache_key(
+            LAYOUT_MODEL, LAYOUT_TEMPERATURE, refined_prompt, context_hash(JSON_GENERATION_SYSTEM_PROMPT)
+        )
+        elements = layout_cache.stream(cache_key, lambda: generate_layout(refined_prompt))
+
+        # Elements are enriched by background tasks while the LLM stream keeps being read.
+        # The queue preserves emission order; the semaphore bounds how many are in flight.
+        pending: asyncio.Queue = asyncio.Queue()
+        slots = asyncio.Semaphore(REPLY_MAX_INFLIGHT_ELEMENTS)
+
+        async def produce_elements():
+            started, first_element = time.perf_counter(), True
+            try:
+                async for obj in elements:
+                    if first_element:
+                        metrics.observe("layout_first_element", time.perf_counter() - started)
+                        first_element = False
+                    await slots.acquire()
+                    pending.put_nowait(asyncio.create_task(enrich_element(obj, voice, lang)))
+                metrics.observe("layout", time.perf_counter() - started)
+            finally:
+                pending.put_nowait(None)
+                await elements.aclose()
+
+        producer = asyncio.create_task(produce_elements())
+        narration_task = None
+        layout = CanvasLayout() if LAYOUT_REFLOW else None
+        try:
+            while (task := await pending.get()) is not None:
+                obj, narration = await task
+                if layout:
+                    try:
+                        layout.place(obj)
+                    except Exception as e:
+                        # A bad placement leaves the model's position; it must not end the reply
+                        logger.warning(f"Could not place element {obj.get('type')}: {e}")
+                if narration:
+                    # Taken before the element is sent, so a client leaving at that yield still cancels it
+                    chunks, narration_task = narration
+                yield event(json.dumps(obj), "element")
+                if narration:
+                    # Sentence audio follows its element, so clients can start playback early
+                    for index in range(obj["narrationChunks"]):
+                        chunk = {"id": obj["narrationId"], "index": index, "final": index == obj["narrationChunks"] - 1}
+                        chunk.update(await chunks.get())
+                        yield event(json.dumps({'narration': chunk}), "narration")
+                slots.release()
+            await producer # Re-raises any error from the LLM stream
+        finally:
+            producer.cancel()
+            if narration_task: narration_task.cancel()
+            while not pending.empty():
+                task = pending.get_nowait()
+                if task is not None: cancel_enrichment(task)
+            await asyncio.gather(producer, return_exceptions=True) # Let it leave the shared generation
+
+        metrics.observe("reply", time.perf_counter() - reply_trace.started)
+        logger.info(f"Streaming completed for session: {session_id} in {reply_trace.elapsed_ms()} ms")
+        if layout and layout.moved:
+            logger.debug(f"Layout moved {layout.moved} element(s) to avoid overlaps for session: {session_id}")
+        if trace:
+            yield event(json.dumps({"trace": {"total_ms": reply_trace.elapsed_ms(), "stages": reply_trace.summary()}}), "trace")
+        yield event("[DONE]", "done")
+    except Exception as e:
+        logger.error(f"Error in reply streaming generator: {e}", exc_info=True)
+        yield event(json.dumps({'error': str(e)}), "error")
+
+
 # --- FLASK APP ---
 app = Flask(__name__)
 CORS(app) # Enable Cross-Origin Resource Sharing for all routes
 
+def upload_limit(field: str) -> int:
+    """The largest file accepted in a form field; files in fields no endpoint reads get the smallest limit."""
+    if field == "audio_file":
+        return MAX_AUDIO_UPLOAD_BYTES
+    if field == "pdf_file":
+        return MAX_PDF_UPLOAD_BYTES
+    return MAX_IMAGE_UPLOAD_BYTES if field.startswith("image_file_") else min(
+        MAX_AUDIO_UPLOAD_BYTES, MAX_PDF_UPLOAD_BYTES, MAX_IMAGE_UPLOAD_BYTES
+    )
+
+# Uploaded files are spooled to disk as they arrive, each refused with 413 once it passes
+# its field's limit; larger request bodies are refused outright
+app.request_class = spooling_request_class(UPLOADS_SPOOL_DIR, upload_limit)
+app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
+if multiprocessing.parent_process() is None:
+    remove_stale_uploads(UPLOADS_SPOOL_DIR, max_age=3600)
+
 # --- API ENDPOINTS ---
 
 @app.route("/api/speech-to-prompt", methods=['POST'])
@@ -259,42 +747,44 @@ async def speech_to_prompt():
 
     logger.info(f"Received STP request for session_id: {session_id}")
 
-    try:
-        # 1. Transcribe Audio using OpenAI API
-        transcribed_text = await transcribe_audio(audio_file.stream, audio_file.filename)
+    # Only documents registered through /api/register-document are remembered; a `pdf_file`
+    # applies to this request alone, so removing it in the UI removes it from the context
+    document_id = request.form.get('document_id') or session_store.get(session_id).get('document_id')
+    stp_trace = start_trace()
 
-        # 2. Process PDF for context (if provided)
-        retrieved_text = ""
-        if pdf_file:
-            logger.info(f"Processing PDF: {pdf_file.filename}")
-            try:
-                pdf_content = pdf_file.read()
-                full_text = ""
-                with fitz.open(stream=pdf_content, filetype="pdf") as doc:
-                    full_text = "".join(page.get_text() for page in doc)
-
-                if full_text.strip():
-                    words = full_text.split()
-                    if len(words) > PDF_MAX_WORDS:
-                        retrieved_text = " ".join(words[:PDF_MAX_WORDS])
-                        logger.info(f"PDF content truncated to the first {PDF_MAX_WORDS} words.")
-                    else:
-                        retrieved_text = full_text
-                else:
-                    logger.warning(f"PDF '{pdf_file.filename}' contains no extractable text.")
-            except Exception as e:
-                logger.error(f"Failed to process PDF {pdf_file.filename}: {e}", exc_info=True)
-                retrieved_text = "" # Proceed without PDF context on error
-
-        # 3. Process images for visual context
-        image_context = []
-        if image_files:
-            for img_file in image_files:
-                img_content = img_file.read()
-                data_url = image_to_base64_data_url(img_content, img_file.filename)
-                if data_url:
-                    image_context.append({"type": "image_url", "image_url": {"url": data_url}})
-            logger.info(f"Loaded {len(image_context)} images for context.")
+    try:
+        # 1. Transcribe audio using the OpenAI API. PDF indexing and image preparation don't
+        # need the transcript, so they run at the same time on worker threads.
+        transcription = asyncio.create_task(transcribe_audio(upload_path(audio_file), audio_file.filename))
+
+        # 2. Process PDF for context (uploaded now, or registered earlier for this session)
+        async def pdf_context() -> Tuple[Optional[str], str]:
+            if not (pdf_file or document_id):
+                return None, ""
+            pdf_document_id, pdf_index = await timed(
+                "pdf_index", anyio.to_thread.run_sync(load_pdf_index, pdf_file, document_id)
+            )
+            # Passage selection is the only step that needs the transcript
+            query = await transcription
+            if pdf_index is None:
+                return pdf_document_id, ""
+            retrieved_text = await timed("pdf_select", anyio.to_thread.run_sync(
+                lambda: pdf_index.select_context(query, budget_words=PDF_MAX_WORDS, top_k=PDF_TOP_K)
+            ))
+            if not retrieved_text:
+                logger.warning(f"Document '{pdf_document_id}' contains no extractable text.")
+            return pdf_document_id, retrieved_text
+
+        # 3. Process images for visual context, downscaled and re-encoded in parallel
+        async def image_context_urls() -> List[str]:
+            if not image_files:
+                return []
+            return await timed("images", anyio.to_thread.run_sync(prepare_context_images, image_files))
+
+        transcribed_text, (document_id, retrieved_text), image_urls = await asyncio.gather(
+            transcription, pdf_context(), image_context_urls()
+        )
+        image_context = [{"type": "image_url", "image_url": {"url": data_url}} for data_url in image_urls]
 
         # 4. Refine the prompt with an LLM if context exists
         has_context = bool(retrieved_text or image_context)
@@ -315,18 +805,34 @@ async def speech_to_prompt():
             llm_user_message.extend(image_context)
             llm_messages.append({"role": "user", "content": llm_user_message})
 
-            logger.info("Requesting prompt refinement from Ollama...")
-            response = await client_refinement.chat.completions.create(
-                model="gemma3", messages=llm_messages, max_tokens=LLM_MAX_TOKENS_PROMPT, temperature=0.2
+            async def refine() -> str:
+                logger.info("Requesting prompt refinement from Ollama...")
+                response = await client_refinement.chat.completions.create(
+                    model=REFINEMENT_MODEL, messages=llm_messages, max_tokens=LLM_MAX_TOKENS_PROMPT,
+                    temperature=REFINEMENT_TEMPERATURE,
+                )
+                return response.choices[0].message.content.strip()
+
+            cache_key = response_cache_key(
+                REFINEMENT_MODEL, REFINEMENT_TEMPERATURE, transcribed_text,
+                context_hash(PROMPT_REFINEMENT_SYSTEM_PROMPT, retrieved_text, *image_urls),
             )
-            refined_prompt = response.choices[0].message.content.strip()
+            refined_prompt = await timed("refinement", refinement_cache.get_or_create(cache_key, refine))
 
+        timings = {**stp_trace.durations_ms(), "total": stp_trace.elapsed_ms()}
         logger.info(f"Refined prompt: '{refined_prompt}'")
-        return jsonify({
+        logger.info(f"Speech-to-prompt timings (ms) for session_id {session_id}: {timings}")
+        response = jsonify({
             "refined_prompt": refined_prompt,
             "session_id": session_id,
-            "context_summary": context_summary
+            "context_summary": context_summary,
+            "document_id": document_id,
+            "timings": timings,
         })
+        if trace_requested():
+            response.headers["Server-Timing"] = stp_trace.server_timing()
+            response.headers["Timing-Allow-Origin"] = "*"
+        return response
 
     except Exception as e:
         logger.error(f"Error in speech-to-prompt endpoint: {e}", exc_info=True)
@@ -347,131 +853,124 @@ def reply_stream():
     if not all([refined_prompt, session_id, context_summary]):
         abort(400, "Missing one or more required query parameters: refined_prompt, session_id, context_summary")
 
-    async def event_generator():
-        try:
-            lang = current_language.get("lang", "en_US")
-            voice = get_voice_for_lang(lang) if get_voice_for_lang else None
-
-            messages = [
-                {"role": "system", "content": JSON_GENERATION_SYSTEM_PROMPT},
-                {"role": "user", "content": refined_prompt}
-            ]
-
-            response_stream = await client_generation.chat.completions.create(
-                model="gemma3n", messages=messages, max_tokens=LLM_MAX_TOKENS_JSON, temperature=0.7, stream=True
-            )
-
-            accumulated_content = ""
-            bracket_count = 0
-            in_string = False
-            escape_next = False
-            object_start = -1
-
-            async for chunk in response_stream:
-                delta = chunk.choices[0].delta.content
-                if not delta: continue
-                accumulated_content += delta
-                # Simple and robust JSON object streaming parser
-                for i, char in enumerate(delta):
-                    pos = len(accumulated_content) - len(delta) + i
-                    if in_string:
-                        if escape_next: escape_next = False
-                        elif char == '\\': escape_next = True
-                        elif char == '"': in_string = False
-                    else:
-                        if char == '"': in_string = True
-                        elif char == '{':
-                            if bracket_count == 0: object_start = pos
-                            bracket_count += 1
-                        elif char == '}':
-                            bracket_count -= 1
-                            if bracket_count == 0 and object_start != -1:
-                                json_str = accumulated_content[object_start : pos + 1]
-                                try:
-                                    obj = json.loads(json_str)
-                                    # --- Image Search Logic ---
-                                    if obj.get("type") == "image" and obj.get("search"):
-                                        try:
-                                            image_data = await search_for_image_on_unsplash(obj["search"])
-                                            aspect_ratio = image_data["height"] / image_data["width"] if image_data["width"] > 0 else 1
-                                            final_width = obj.get("width") if isinstance(obj.get("width"), int) else 350
-                                            obj.update({
-                                                "imageUrl": image_data["imageUrl"],
-                                                "width": final_width,
-                                                "height": int(final_width * aspect_ratio)
-                                            })
-                                        except Exception as search_error:
-                                            logger.error(f"Image search failed: {search_error}")
-                                            obj.update({
-                                                "type": "text",
-                                                "content": f"**Error:** Could not find image for '{obj['search']}'",
-                                                "textColor": "#ef4444"
-                                            })
-
-                                    # --- TTS Generation Logic ---
-                                    narration_text = obj.get("speakAloud")
-                                    if narration_text and voice:
-                                        try:
-                                            with io.BytesIO() as wav_buffer:
-                                                with wave.open(wav_buffer, "wb") as wav_file:
-                                                    voice.synthesize_wav(narration_text, wav_file)
-                                                base64_audio = base64.b64encode(wav_buffer.getvalue()).decode('utf-8')
-                                                obj['audioDataUrl'] = f"data:audio/wav;base64,{base64_audio}"
-                                        except Exception as tts_error:
-                                            logger.error(f"Error generating TTS audio: {tts_error}")
-                                            obj['audioDataUrl'] = None
-
-                                    yield f"data: {json.dumps(obj)}\n\n"
-                                except json.JSONDecodeError:
-                                    pass # Incomplete object, wait for more chunks
-
-            logger.info(f"Streaming completed for session: {session_id}")
-            yield "data: [DONE]\n\n"
-        except Exception as e:
-            logger.error(f"Error in reply streaming generator: {e}", exc_info=True)
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+    lang = session_language(session_id)
+    trace = trace_requested()
 
     def sync_event_stream():
-        # Use anyio to run the async generator and yield results synchronously
-        async def run_and_yield():
-            async for item in event_generator():
-                yield item
-
-        # anyio.to_thread.run_sync expects a sync function, so we use a queue to bridge async->sync
-        import queue
-        import threading
-
-        q = queue.Queue()
+        # Bridge the async generator onto this WSGI worker through a bounded queue. The
+        # client going away (Werkzeug closing this generator) stops the producer, which
+        # in turn closes the upstream LLM stream.
+        q = queue.Queue(maxsize=REPLY_STREAM_BUFFER)
         sentinel = object()
+        client_gone = threading.Event()
+
+        async def put(item) -> bool:
+            """Hands an item to the worker, waiting for room on a thread; False once the client is gone."""
+            if client_gone.is_set():
+                return False
+            await anyio.to_thread.run_sync(q.put, item)
+            return True
 
         def runner():
             async def async_runner():
-                async for item in event_generator():
-                    q.put(item)
-                q.put(sentinel)
-            anyio.run(async_runner)
+                events = generate_reply_events(refined_prompt, session_id, lang, trace=trace)
+                try:
+                    async for item in events:
+                        if not await put(item):
+                            logger.info(f"Client disconnected, cancelling reply for session: {session_id}")
+                            break
+                finally:
+                    try:
+                        await events.aclose()
+                    finally:
+                        await put(sentinel)
+            try:
+                anyio.run(async_runner)
+            except Exception as e:
+                logger.error(f"Reply producer failed for session {session_id}: {e}", exc_info=True)
 
-        thread = threading.Thread(target=runner)
+        thread = threading.Thread(target=runner, daemon=True)
         thread.start()
-        while True:
-            item = q.get()
-            if item is sentinel:
-                break
-            yield item
-        thread.join()
+        try:
+            while (item := q.get()) is not sentinel:
+                yield item
+        finally:
+            client_gone.set()
+            # Frees a hand-off already waiting for room; the producer stops before its next one
+            while True:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    break
 
     return Response(sync_event_stream(), mimetype="text/event-stream")
 
+@app.route("/api/register-document", methods=['POST'])
+def register_document():
+    """
+    Extracts and indexes a PDF once and remembers it for the session, so later
+    speech-to-prompt requests can omit `pdf_file` (or pass the returned `document_id`).
+    """
+    if 'session_id' not in request.form or 'pdf_file' not in request.files:
+        abort(400, description="Missing 'session_id' or 'pdf_file' in form data.")
+    session_id = request.form['session_id']
+    pdf_file = request.files['pdf_file']
+    try:
+        document_id, pdf_index = index_pdf(pdf_file)
+    except Exception as e:
+        logger.error(f"Failed to register PDF {pdf_file.filename}: {e}", exc_info=True)
+        abort(422, description="The PDF could not be processed.")
+    session_store.update(session_id, document_id=document_id)
+    logger.info(f"Registered document {document_id[:12]} for session_id: {session_id}")
+    return jsonify({
+        "document_id": document_id,
+        "session_id": session_id,
+        "chunks": len(pdf_index),
+        "words": pdf_index.total_words,
+    })
+
+@app.route("/api/audio/<audio_id>", methods=['GET'])
+def narration_audio(audio_id: str):
+    """Serves encoded narration audio referenced by `audioUrl`, with range and caching support."""
+    cache_key, _, extension = audio_id.partition(".")
+    fmt = next((f for f in AUDIO_FORMATS if audio_extension(f) == extension), None)
+    audio_bytes = narration_audio_cache.get(cache_key) if fmt and AUDIO_ID_RE.fullmatch(cache_key) else None
+    if audio_bytes is None:
+        abort(404, description="Unknown or expired audio id.")
+    # Ids are content hashes, so the response never changes and can be cached indefinitely
+    response = send_file(
+        io.BytesIO(audio_bytes), mimetype=audio_mime_type(fmt), conditional=True,
+        etag=cache_key, max_age=31536000, download_name=audio_id,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route("/api/voices", methods=['GET'])
+def voices_status():
+    """Lists the discovered voices with their load time and memory footprint."""
+    return jsonify({
+        "preload": PRELOAD_LANGS,
+        "voices": voice_registry.status(),
+        "tts_pool": tts_executor.status(),
+    })
+
+@app.route("/metrics", methods=['GET'])
+def metrics_endpoint():
+    """Exposes this process's counters and stage latency histograms in the Prometheus text format."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/api/set-language", methods=['POST'])
 def set_language():
-    """Receives the selected language from the frontend and stores it."""
+    """Receives the selected language from the frontend and stores it for the session."""
     data = request.get_json()
     lang = data.get("lang")
-    if not lang:
-        abort(400, description="Missing 'lang' in request body.")
-    current_language["lang"] = lang.replace("-", "_")
-    logger.info(f"Language set to: {current_language['lang']}")
-    return jsonify({"status": "ok", "lang": current_language['lang']})
+    session_id = data.get("session_id")
+    if not lang or not session_id:
+        abort(400, description="Missing 'lang' or 'session_id' in request body.")
+    lang = session_store.update(session_id, lang=lang.replace("-", "_"))["lang"]
+    logger.info(f"Language set to: {lang} for session_id: {session_id}")
+    return jsonify({"status": "ok", "lang": lang, "session_id": session_id})
 
 @app.route("/api/image-search", methods=['GET'])
 async def image_search():
@@ -0,0 +1,201 @@
+"""
+In-process metrics and per-request traces.
+
+Counters and histograms are rendered in the Prometheus text format by `render()`.
+`span(stage)` times a block: the duration always goes into the `stage_seconds`
+histogram, and into the current request's `Trace` when one was started with
+`start_trace()`. Traces follow asyncio tasks through `contextvars`, so spans in
+enrichment tasks land in the trace of the reply that created them.
+
+Metrics are per process; with several workers, scrape each one or aggregate upstream.
+"""
+import math
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+PREFIX = "tutorlm_"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = PREFIX + name
+        self.help = help_text
+        self.labels = labels
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = PREFIX + name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # Per label set: (bucket counts, sum, count)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            index = bisect_left(self.buckets, value)
+            if index < len(counts):
+                counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (math.inf,), counts + [count - sum(counts)]):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+# Collectors report values owned elsewhere (e.g. cache statistics) at scrape time, as
+# (metric name, type, help, {label: value}, value) samples
+Sample = Tuple[str, str, str, Dict[str, str], float]
+_collectors: List[Callable[[], List[Sample]]] = []
+_metrics: List = []
+
+
+def counter(name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+    metric = Counter(name, help_text, labels)
+    _metrics.append(metric)
+    return metric
+
+
+def histogram(name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    metric = Histogram(name, help_text, labels, buckets)
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(collect: Callable[[], List[Sample]]) -> None:
+    _collectors.append(collect)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    families: Dict[str, Tuple[str, str, List[str]]] = {}
+    for collect in _collectors:
+        for name, kind, help_text, labels, value in collect():
+            name = PREFIX + name
+            label_text = _format_labels(tuple(labels), tuple(labels.values()))
+            families.setdefault(name, (kind, help_text, []))[2].append(f"{name}{label_text} {_format_value(value)}")
+    for name, (kind, help_text, samples) in families.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", *samples]
+    return "\n".join(lines) + "\n"
+
+
+# --- TRACES ---
+
+STAGE_SECONDS = histogram("stage_seconds", "Duration of instrumented pipeline stages.", ("stage",))
+
+
+class Trace:
+    """The spans recorded while serving one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._spans: Dict[str, List[float]] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self._spans.setdefault(stage, []).append(seconds)
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 1)
+
+    def durations_ms(self) -> Dict[str, float]:
+        """Total time per stage, in milliseconds."""
+        return {stage: round(sum(spans) * 1000, 1) for stage, spans in self._spans.items()}
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Count, total and slowest span per stage, in milliseconds; for stages that repeat per element."""
+        return {
+            stage: {"count": len(spans), "total_ms": round(sum(spans) * 1000, 1), "max_ms": round(max(spans) * 1000, 1)}
+            for stage, spans in self._spans.items()
+        }
+
+    def server_timing(self) -> str:
+        """The stage totals as a `Server-Timing` header value."""
+        entries = [f"{stage};dur={ms}" for stage, ms in self.durations_ms().items()]
+        return ", ".join(entries + [f"total;dur={self.elapsed_ms()}"])
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+def start_trace() -> Trace:
+    """Starts a trace for the current request; spans in this context (and tasks it creates) record into it."""
+    trace = Trace()
+    _current_trace.set(trace)
+    return trace
+
+
+def observe(stage: str, seconds: float) -> None:
+    """Records a stage duration measured by the caller, as `span` does."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+class Span:
+    __slots__ = ("seconds",)
+
+    def __init__(self):
+        self.seconds = 0.0
+
+
+@contextmanager
+def span(stage: str) -> Iterator[Span]:
+    """Times the enclosed block as `stage`."""
+    result = Span()
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result.seconds = time.perf_counter() - started
+        observe(stage, result.seconds)
@@ -0,0 +1,149 @@
+import os
+import re
+import mmap
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pdf_context import PdfIndex
+
+logger = logging.getLogger(__name__)
+
+# Array files written for every cached index; all are loaded with mmap_mode="r"
+_ARRAYS = ("chunk_offsets", "chunk_pages", "chunk_lengths", "term_offsets", "postings_chunk", "postings_tf")
+
+_DOCUMENT_ID_RE = re.compile(r"[0-9a-f]{64}")
+
+
+class MappedChunks(Sequence):
+    """Chunk texts decoded on demand from one memory-mapped UTF-8 blob."""
+
+    def __init__(self, blob: mmap.mmap, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._blob[start:end].decode("utf-8")
+
+
+class PdfIndexCache:
+    """
+    On-disk cache of extracted PDF chunks and their BM25 index, keyed by the SHA-256 of
+    the document. Each entry is a directory of `.npy` arrays plus a UTF-8 text blob, all
+    memory-mapped on load, so a repeated upload never touches PyMuPDF. Entries are
+    written to a temporary directory and renamed into place, which makes concurrent
+    writers (threads or worker processes) safe. The least recently used entries are
+    evicted once the cache grows past `max_bytes`.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, params: dict):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        # Indexes built with different chunking settings get their own entries
+        self.params_key = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:8]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_dir(self, doc_hash: str) -> Path:
+        return self.root / f"{doc_hash}-{self.params_key}"
+
+    def load(self, doc_hash: str) -> Optional[PdfIndex]:
+        """Returns the cached index for a document hash, or None. Safe on untrusted ids."""
+        if not _DOCUMENT_ID_RE.fullmatch(doc_hash or ""):
+            return None
+        entry = self._entry_dir(doc_hash)
+        try:
+            arrays = {name: np.load(entry / f"{name}.npy", mmap_mode="r") for name in _ARRAYS}
+            with open(entry / "text.bin", "rb") as f:
+                blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+            vocabulary = {term: i for i, term in enumerate((entry / "vocab.txt").read_text("utf-8").split("\n")) if term}
+            os.utime(entry)  # Recency for eviction
+        except (OSError, ValueError):
+            return None
+        return PdfIndex(
+            chunks=MappedChunks(blob, arrays["chunk_offsets"]),
+            chunk_pages=arrays["chunk_pages"],
+            vocabulary=vocabulary,
+            term_offsets=arrays["term_offsets"],
+            postings_chunk=arrays["postings_chunk"],
+            postings_tf=arrays["postings_tf"],
+            chunk_lengths=arrays["chunk_lengths"],
+        )
+
+    def store(self, doc_hash: str, index: PdfIndex) -> None:
+        entry = self._entry_dir(doc_hash)
+        tmp = self.root / f".{entry.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            tmp.mkdir(parents=True)
+            encoded = [chunk.encode("utf-8") for chunk in index.chunks]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+            (tmp / "text.bin").write_bytes(b"".join(encoded))
+            terms = sorted(index.vocabulary, key=index.vocabulary.__getitem__)
+            (tmp / "vocab.txt").write_text("\n".join(terms), "utf-8")
+            arrays = {
+                "chunk_offsets": offsets,
+                "chunk_pages": index.chunk_pages,
+                "chunk_lengths": index.chunk_lengths,
+                "term_offsets": index.term_offsets,
+                "postings_chunk": index.postings_chunk,
+                "postings_tf": index.postings_tf,
+            }
+            for name, array in arrays.items():
+                np.save(tmp / f"{name}.npy", np.ascontiguousarray(array))
+            os.rename(tmp, entry)
+        except OSError as e:
+            # Most likely another writer got there first
+            logger.debug(f"Not caching PDF index {doc_hash[:12]}: {e}")
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self._evict()
+
+    def get_or_build(self, doc_hash: str, build: Callable[[], PdfIndex]) -> Tuple[str, PdfIndex]:
+        """Returns (doc_hash, index) for the document with SHA-256 `doc_hash`, extracting it only on a cache miss."""
+        index = self.load(doc_hash)
+        with self._lock:
+            if index is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if index is None:
+            index = build()
+            self.store(doc_hash, index)
+        return doc_hash, index
+
+    def _evict(self) -> None:
+        entries = []
+        for entry in self.root.iterdir():
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            try:
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            logger.info(f"Evicted cached PDF index {entry.name}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,158 @@
+import re
+import logging
+from pathlib import Path
+from collections import Counter
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import fitz  # PyMuPDF
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# BM25 parameters (the usual defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def iter_page_texts(doc, max_pages: int) -> Iterator[Tuple[int, str]]:
+    """Lazily yields (page number, text) for up to `max_pages` pages of a PyMuPDF document."""
+    for page_number in range(min(len(doc), max_pages)):
+        text = doc.load_page(page_number).get_text("text")
+        if text.strip():
+            yield page_number + 1, text
+
+
+def chunk_pages(pages: Iterator[Tuple[int, str]], chunk_words: int, overlap_words: int) -> Tuple[List[str], List[int]]:
+    """Splits each page into overlapping windows of roughly `chunk_words` words."""
+    step = max(1, chunk_words - overlap_words)
+    chunks, chunk_pages_ = [], []
+    for page_number, text in pages:
+        words = text.split()
+        for start in range(0, len(words), step):
+            chunks.append(" ".join(words[start:start + chunk_words]))
+            chunk_pages_.append(page_number)
+            if start + chunk_words >= len(words):
+                break
+    return chunks, chunk_pages_
+
+
+class PdfIndex:
+    """
+    BM25 index over the chunks of one document.
+
+    Postings are stored in CSR form: the postings of term `t` are
+    `postings_chunk[term_offsets[t]:term_offsets[t + 1]]` with matching term frequencies
+    in `postings_tf`, so scoring a query is a handful of vectorized NumPy operations
+    per query term.
+    """
+
+    def __init__(self, chunks: Sequence[str], chunk_pages: np.ndarray, vocabulary: Dict[str, int],
+                 term_offsets: np.ndarray, postings_chunk: np.ndarray, postings_tf: np.ndarray,
+                 chunk_lengths: np.ndarray):
+        self.chunks = chunks
+        self.chunk_pages = chunk_pages
+        self.vocabulary = vocabulary
+        self.term_offsets = term_offsets
+        self.postings_chunk = postings_chunk
+        self.postings_tf = postings_tf
+        self.chunk_lengths = chunk_lengths
+        self.average_length = float(chunk_lengths.mean()) if len(chunk_lengths) else 0.0
+
+    @classmethod
+    def build(cls, chunks: List[str], chunk_pages: List[int]) -> "PdfIndex":
+        vocabulary: Dict[str, int] = {}
+        term_ids, chunk_ids, tfs = [], [], []
+        chunk_lengths = np.zeros(len(chunks), dtype=np.int32)
+        for chunk_id, chunk in enumerate(chunks):
+            tokens = tokenize(chunk)
+            chunk_lengths[chunk_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                chunk_ids.append(chunk_id)
+                tfs.append(tf)
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        order = np.argsort(term_ids, kind="stable")
+        term_offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=term_offsets[1:])
+        return cls(
+            chunks=chunks,
+            chunk_pages=np.asarray(chunk_pages, dtype=np.int32),
+            vocabulary=vocabulary,
+            term_offsets=term_offsets,
+            postings_chunk=np.asarray(chunk_ids, dtype=np.int32)[order],
+            postings_tf=np.asarray(tfs, dtype=np.float32)[order],
+            chunk_lengths=chunk_lengths,
+        )
+
+    @classmethod
+    def from_document(cls, doc, max_pages: int, chunk_words: int, overlap_words: int) -> "PdfIndex":
+        chunks, pages = chunk_pages(iter_page_texts(doc, max_pages), chunk_words, overlap_words)
+        return cls.build(chunks, pages)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def total_words(self) -> int:
+        return int(self.chunk_lengths.sum())
+
+    def score(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk for `query`."""
+        n_chunks = len(self.chunks)
+        scores = np.zeros(n_chunks, dtype=np.float32)
+        if not n_chunks:
+            return scores
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self.chunk_lengths / max(self.average_length, 1.0))
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            chunk_ids = self.postings_chunk[start:end]
+            tf = self.postings_tf[start:end]
+            df = end - start
+            idf = np.log1p((n_chunks - df + 0.5) / (df + 0.5))
+            # Each chunk appears at most once per term, so plain fancy-index addition is safe
+            scores[chunk_ids] += idf * tf * (BM25_K1 + 1) / (tf + length_norm[chunk_ids])
+        return scores
+
+    def select_context(self, query: str, budget_words: int, top_k: int) -> str:
+        """
+        Returns the passages most relevant to `query` that fit in `budget_words`, in
+        document order. Short documents are returned whole, and the opening of the
+        document is used when nothing matches.
+        """
+        if not len(self.chunks):
+            return ""
+        # Token counts stand in for word counts so that budgeting never decodes chunk text
+        word_counts = self.chunk_lengths
+        scores = self.score(query)
+        if self.total_words <= budget_words or scores.max() <= 0:
+            candidates = np.arange(len(self.chunks))
+        else:
+            candidates = np.argsort(-scores, kind="stable")[:top_k]
+            candidates = candidates[scores[candidates] > 0]
+
+        selected, used = [], 0
+        for chunk_id in candidates:
+            if used + word_counts[chunk_id] > budget_words:
+                continue
+            selected.append(int(chunk_id))
+            used += int(word_counts[chunk_id])
+
+        return "\n...\n".join(f"[p. {self.chunk_pages[i]}] {self.chunks[i]}" for i in sorted(selected))
+
+
+def build_pdf_index(pdf_path: Path, max_pages: int, chunk_words: int, overlap_words: int) -> PdfIndex:
+    """Extracts and indexes a PDF file; PyMuPDF reads pages from disk as they are extracted."""
+    with fitz.open(pdf_path, filetype="pdf") as doc:
+        index = PdfIndex.from_document(doc, max_pages, chunk_words, overlap_words)
+    logger.info(f"Indexed {len(index)} PDF chunks ({index.total_words} words).")
+    return index
@@ -0,0 +1,132 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict
+
+from caching import TTLCache
+
+logger = logging.getLogger(__name__)
+
+SESSION_STORES = ("memory", "sqlite")
+
+
+class MemorySessionStore:
+    """
+    Per-session state held in this process: an LRU of `max_entries` sessions, each
+    expiring `ttl` seconds after it was last written. Only suitable for a single worker.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self._sessions = TTLCache(max_entries=max_entries, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Dict[str, Any]:
+        """Returns a copy of the session's state, or an empty dict for unknown sessions."""
+        return dict(self._sessions.get(session_id, {}))
+
+    def update(self, session_id: str, **fields: Any) -> Dict[str, Any]:
+        """Merges `fields` into the session's state and refreshes its expiry."""
+        with self._lock:
+            state = {**self._sessions.get(session_id, {}), **fields}
+            self._sessions.set(session_id, state)
+        return dict(state)
+
+    def delete(self, session_id: str) -> None:
+        self._sessions.pop(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", **self._sessions.stats()}
+
+
+class SQLiteSessionStore:
+    """
+    Per-session state in a SQLite database, shared by every worker process on the host.
+    Sessions expire `ttl` seconds after they were last written; expired rows are purged
+    every `purge_every` writes. The database runs in WAL mode so readers never block
+    the writer.
+    """
+
+    def __init__(self, path: Path, ttl: float, purge_every: int = 500):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._writes = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across threads, so each thread opens its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> Dict[str, Any]:
+        """Returns the session's state, or an empty dict for unknown or expired sessions."""
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE session_id = ? AND expires_at > ?", (session_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def update(self, session_id: str, **fields: Any) -> Dict[str, Any]:
+        """Merges `fields` into the session's state and refreshes its expiry."""
+        conn = self._connection()
+        now = time.time()
+        # IMMEDIATE takes the write lock up front, so concurrent updates from other
+        # workers can't interleave between our read and our write
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT data FROM sessions WHERE session_id = ? AND expires_at > ?", (session_id, now)
+            ).fetchone()
+            state = {**(json.loads(row[0]) if row else {}), **fields}
+            conn.execute(
+                "INSERT INTO sessions (session_id, data, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+                (session_id, json.dumps(state), now + self.ttl),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._writes += 1
+        if self.purge_every and self._writes % self.purge_every == 0:
+            self._purge_expired()
+        return state
+
+    def delete(self, session_id: str) -> None:
+        self._connection().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def _purge_expired(self) -> None:
+        try:
+            deleted = self._connection().execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"Could not purge expired sessions: {e}")
+            return
+        if deleted:
+            logger.info(f"Purged {deleted} expired session(s).")
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._connection().execute(
+            "SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+        return {"backend": "sqlite", "entries": entries}
+
+
+def create_session_store(backend: str, max_entries: int, ttl: float, db_path: Path):
+    if backend == "memory":
+        return MemorySessionStore(max_entries=max_entries, ttl=ttl)
+    if backend == "sqlite":
+        return SQLiteSessionStore(db_path, ttl=ttl)
+    raise ValueError(f"SESSION_STORE must be one of {SESSION_STORES}, not '{backend}'.")
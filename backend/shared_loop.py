@@ -0,0 +1,83 @@
+import atexit
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SharedLoop:
+    """
+    A long-lived event loop on a daemon thread. Flask runs each async view (and each
+    reply stream) on its own short-lived loop, so anything that must outlive a request,
+    such as pooled HTTP connections or in-flight de-duplication, is run here instead.
+    Under the ASGI server the server's own loop is adopted and no thread is started.
+    """
+
+    def __init__(self, name: str = "shared-io-loop"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._shutdown_hooks: List[Callable[[], Awaitable[None]]] = []
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+            return self._loop
+
+    def adopt(self, loop: asyncio.AbstractEventLoop) -> bool:
+        """
+        Uses an already-running server loop (e.g. the ASGI server's) as the shared loop,
+        so work submitted from that loop runs inline instead of hopping threads.
+        Returns False if a loop was already started.
+        """
+        with self._lock:
+            if self._loop is not None:
+                return False
+            self._loop = loop
+            return True
+
+    def on_shutdown(self, hook: Callable[[], Awaitable[None]]) -> None:
+        """Registers a coroutine function to run on the loop before it stops."""
+        self._shutdown_hooks.append(hook)
+
+    async def run(self, coro: Awaitable[Any]) -> Any:
+        """Runs `coro` on the shared loop and awaits its result from the caller's loop."""
+        loop = self.loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    async def run_shutdown_hooks(self) -> None:
+        for hook in self._shutdown_hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logger.warning(f"Shared loop shutdown hook failed: {e}")
+
+    def stop(self) -> None:
+        with self._lock:
+            loop, thread, self._loop, self._thread = self._loop, self._thread, None, None
+        if loop is None or thread is None:
+            return  # Adopted loops belong to the server, which runs the hooks itself
+        try:
+            asyncio.run_coroutine_threadsafe(self.run_shutdown_hooks(), loop).result(timeout=5)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+
+
+# The process-wide loop used for outbound I/O
+shared_loop = SharedLoop()
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from json_stream import JSONObjectStream
+
+ELEMENTS = [
+    {"type": "text", "content": "A \"quoted\" {brace} and a backslash \\ then }", "x": 50, "y": 100},
+    {"type": "card", "content": "Nested", "style": {"border": {"width": 2}}, "x": 450, "y": 100},
+    {"type": "text", "content": "Unicode é中 and escaped \\\" quote", "x": 50, "y": 300},
+]
+
+
+def feed_all(parser: JSONObjectStream, chunks) -> list:
+    objects = []
+    for chunk in chunks:
+        objects.extend(parser.feed(chunk))
+    parser.close()
+    return objects
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64])
+def test_objects_split_at_any_chunk_boundary(size):
+    text = json.dumps(ELEMENTS, indent=2)
+    parser = JSONObjectStream()
+    assert feed_all(parser, [text[i:i + size] for i in range(0, len(text), size)]) == ELEMENTS
+    assert parser.stats() == {
+        "objects_parsed": 3, "parse_failures": 0, "chars_scanned": len(text), "truncated": False,
+    }
+
+
+def test_escapes_and_braces_split_between_chunks():
+    parser = JSONObjectStream()
+    chunks = ['[{"content": "a \\', '"{', '\\\\', '", "x": {"y": "}', '"}}]']
+    assert feed_all(parser, chunks) == [{"content": 'a "{\\', "x": {"y": "}"}}]
+
+
+def test_code_fences_and_prose_are_skipped():
+    text = "Here is the layout:\n```json\n" + json.dumps(ELEMENTS) + "\n```\nLet me know if you need more."
+    parser = JSONObjectStream()
+    assert feed_all(parser, [text[:20], text[20:45], text[45:]]) == ELEMENTS
+    assert parser.parse_failures == 0
+
+
+def test_malformed_objects_are_counted_and_skipped():
+    parser = JSONObjectStream()
+    text = '[{"type": "text", "x": 1,}, {"type": "card", "x": 2}, {"a": NaNx}]'
+    assert feed_all(parser, [text]) == [{"type": "card", "x": 2}]
+    assert (parser.objects_parsed, parser.parse_failures, parser.truncated) == (1, 2, False)
+
+
+def test_truncated_stream_is_flagged_on_close():
+    parser = JSONObjectStream()
+    assert parser.feed('[{"type": "text", "x": 1}, {"type": "card", "content": "cut {off') == [{"type": "text", "x": 1}]
+    assert not parser.truncated
+    parser.close()
+    assert parser.truncated and parser.parse_failures == 1 and parser.objects_parsed == 1
+
@@ -0,0 +1,77 @@
+import pytest
+
+from layout import GAP, MARGIN, CanvasLayout, Skyline, element_box
+
+
+def overlaps(a, b) -> bool:
+    (ax, ay, aw, ah), (bx, by, bw, bh) = a, b
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+
+def box(obj):
+    width, height = element_box(obj)
+    return obj["x"], obj["y"], width, height
+
+
+def test_elements_in_one_column_are_pushed_below_each_other():
+    layout = CanvasLayout()
+    first = layout.place({"type": "card", "content": "Glucose is broken down. " * 10, "x": 50, "y": 100, "width": 350})
+    second = layout.place({"type": "card", "content": "ATP stores energy.", "x": 50, "y": 100, "width": 350})
+    assert second["y"] == round(first["y"] + element_box(first)[1] + GAP)
+    assert layout.moved == 1
+
+
+def test_side_by_side_columns_keep_their_positions():
+    layout = CanvasLayout()
+    left = layout.place({"type": "card", "content": "Left", "x": 50, "y": 100, "width": 350})
+    right = layout.place({"type": "image", "x": 450, "y": 100, "width": 300, "height": 200})
+    assert (left["x"], left["y"], right["x"], right["y"]) == (50, 100, 450, 100)
+    assert layout.moved == 0
+
+
+def test_missing_and_invalid_coordinates_are_clamped_to_the_margin():
+    obj = CanvasLayout().place({"type": "text", "content": "Title", "x": "abc", "y": -40})
+    assert (obj["x"], obj["y"]) == (MARGIN, MARGIN)
+
+
+@pytest.mark.parametrize("bad", [
+    {"type": "image", "width": 0, "height": 0, "x": 50},
+    {"type": "card", "content": "Negative", "width": -20, "x": 50},
+    {"type": "text", "content": "Tiny", "fontSize": 0, "width": 0, "x": 50},
+    {"type": "image", "width": None, "height": -10, "x": 50, "y": 10},
+])
+def test_degenerate_sizes_are_placed_without_errors(bad):
+    layout = CanvasLayout()
+    first = layout.place({"type": "card", "content": "Earlier card", "x": 50, "y": 50, "width": 300})
+    placed = layout.place(bad)
+    assert placed["y"] >= first["y"] + element_box(first)[1]
+
+
+def test_skyline_of_an_empty_range_is_minus_infinity():
+    skyline = Skyline()
+    skyline.raise_to(50, 100, 300)
+    assert skyline.max_bottom(50, 50) == float("-inf")
+    assert skyline.max_bottom(60, 70) == 300
+    assert skyline.max_bottom(100, 150) == float("-inf")
+
+
+def test_lines_and_unknown_types_pass_through():
+    line = {"type": "line", "x1": 0, "y1": 0, "x2": 10, "y2": 10}
+    assert CanvasLayout().place(dict(line)) == line
+
+
+def test_random_layouts_never_overlap():
+    import random
+
+    rng = random.Random(7)
+    layout = CanvasLayout()
+    placed = []
+    for _ in range(300):
+        kind = rng.choice(["text", "card", "image"])
+        obj = {"type": kind, "x": rng.randint(0, 1200), "y": rng.randint(0, 2000), "width": rng.randint(100, 400)}
+        if kind == "image":
+            obj["height"] = rng.randint(50, 300)
+        else:
+            obj["content"] = "word " * rng.randint(1, 60)
+        placed.append(box(layout.place(obj)))
+    assert not any(overlaps(a, b) for i, a in enumerate(placed) for b in placed[:i])
@@ -0,0 +1,111 @@
+import io
+import asyncio
+
+import numpy as np
+import soundfile as sf
+
+import transcription
+from transcription import (
+    RMS_BLOCK_FRAMES, ChunkedTranscriber, frame_rms, probe_duration, split_at_silence, stitch_transcripts,
+)
+
+RATE = 16000
+
+
+def speech(seconds: float, pause_at=()) -> np.ndarray:
+    """A loud tone with 0.3s of silence starting at each second in `pause_at`."""
+    t = np.arange(int(seconds * RATE)) / RATE
+    samples = (0.5 * np.sin(2 * np.pi * 440 * t) * 32767).astype(np.int16)
+    for second in pause_at:
+        samples[int(second * RATE):int((second + 0.3) * RATE)] = 0
+    return samples
+
+
+def test_frame_rms_read_in_blocks_matches_the_whole_signal(tmp_path):
+    frame = int(RATE * transcription.FRAME_SECONDS)
+    stereo = np.stack([speech(25), speech(25) // 2], axis=1)
+    path = tmp_path / "stereo.wav"
+    sf.write(path, stereo, RATE)
+
+    rms = frame_rms(path, frame)
+
+    mono = stereo.astype(np.float32).mean(axis=1) / 32768.0
+    n_frames = len(mono) // frame
+    expected = np.sqrt(np.mean(mono[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1))
+    assert len(rms) == n_frames > RMS_BLOCK_FRAMES
+    np.testing.assert_allclose(rms, expected, atol=1e-5)
+
+
+def test_split_at_silence_cuts_in_pauses_and_covers_the_recording(tmp_path):
+    path = tmp_path / "long.wav"
+    sf.write(path, speech(75, pause_at=(9, 19, 29)), RATE)
+
+    chunks = split_at_silence(path, chunk_seconds=10, overlap_seconds=1)
+
+    assert chunks[0][0] == 0 and chunks[-1][1] == 75 * RATE
+    for (_, end, _), (start, _, overlaps) in zip(chunks, chunks[1:]):
+        if end < 30 * RATE:
+            assert not overlaps and start == end and np.all(speech(75, (9, 19, 29))[end - 10:end + 10] == 0)
+        else:
+            assert overlaps and start == end - RATE
+
+
+def test_short_recordings_are_sent_whole_without_decoding(tmp_path, monkeypatch):
+    path = tmp_path / "short.wav"
+    sf.write(path, speech(5), RATE)
+    monkeypatch.setattr(transcription, "readable_source", lambda _: (_ for _ in ()).throw(AssertionError("decoded")))
+    sent = []
+
+    async def transcribe(file):
+        sent.append(file[0])
+        return "hello"
+
+    transcriber = ChunkedTranscriber(transcribe, chunk_seconds=10, overlap_seconds=1, max_concurrency=2)
+    assert probe_duration(path) == 5
+    assert asyncio.run(transcriber.transcribe(path, "short.wav")) == "hello"
+    assert sent == ["short.wav"]
+
+
+def test_long_recordings_are_transcribed_in_chunks_in_order(tmp_path):
+    path = tmp_path / "long.wav"
+    sf.write(path, speech(45, pause_at=(9, 19, 29, 39)), RATE)
+
+    async def transcribe(file):
+        name, content = file
+        samples, rate = sf.read(io.BytesIO(content))
+        await asyncio.sleep(0.01 * (5 - int(name.split("-")[1].split(".")[0])))  # Finish out of order
+        return f"{name} {len(samples) / rate:.1f}s"
+
+    transcriber = ChunkedTranscriber(transcribe, chunk_seconds=10, overlap_seconds=1, max_concurrency=2)
+    text = asyncio.run(transcriber.transcribe(path, "lecture.wav"))
+
+    names = text.split()[::2]
+    assert names == [f"lecture-{i}.flac" for i in range(len(names))] and len(names) == 5
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["long.wav"]
+
+
+def test_stitching_drops_words_repeated_across_an_overlap():
+    texts = ["the cell makes energy from gluc", "energy from glucose using oxygen"]
+    assert stitch_transcripts(texts, [False, True]) == "the cell makes energy from glucose using oxygen"
+
+
+def test_recordings_sent_whole_do_not_wait_for_chunk_slots(tmp_path):
+    path = tmp_path / "short.wav"
+    sf.write(path, speech(5), RATE)
+    in_flight, peak = 0, 0
+
+    async def transcribe(file):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return "hello"
+
+    transcriber = ChunkedTranscriber(transcribe, chunk_seconds=10, overlap_seconds=1, max_concurrency=1)
+
+    async def run():
+        return await asyncio.gather(*(transcriber.transcribe(path, "short.wav") for _ in range(3)))
+
+    assert asyncio.run(run()) == ["hello"] * 3
+    assert peak == 3
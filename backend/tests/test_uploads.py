@@ -0,0 +1,30 @@
+import io
+
+from flask import Flask, jsonify, request
+
+from uploads import spooling_request_class, upload_path
+
+LIMITS = {"pdf_file": 1000, "image_file_0": 100}
+
+
+def make_app(tmp_path):
+    app = Flask(__name__)
+    app.request_class = spooling_request_class(tmp_path, lambda field: LIMITS.get(field, 10))
+
+    @app.route("/upload", methods=["POST"])
+    def upload():
+        return jsonify({name: upload_path(file).stat().st_size for name, file in request.files.items()})
+
+    return app
+
+
+def test_each_field_is_limited_while_it_is_received(tmp_path):
+    client = make_app(tmp_path).test_client()
+
+    ok = client.post("/upload", data={"pdf_file": (io.BytesIO(b"x" * 1000), "d.pdf")})
+    assert ok.status_code == 200 and ok.get_json() == {"pdf_file": 1000}
+
+    too_big = client.post("/upload", data={"image_file_0": (io.BytesIO(b"x" * 500), "i.png")})
+    assert too_big.status_code == 413
+    assert client.post("/upload", data={"other": (io.BytesIO(b"x" * 50), "o.bin")}).status_code == 413
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,273 @@
+import io
+import os
+import re
+import shutil
+import asyncio
+import logging
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Awaitable, Callable, IO, List, Optional, Tuple, Union
+
+import numpy as np
+import soundfile as sf
+
+from metrics import span
+from shared_loop import shared_loop
+
+logger = logging.getLogger(__name__)
+
+FFMPEG = shutil.which("ffmpeg")
+FFPROBE = shutil.which("ffprobe")
+DECODE_SAMPLE_RATE = 16000  # What ffmpeg resamples to; Whisper works at 16 kHz internally
+FRAME_SECONDS = 0.02  # Resolution of the silence search
+RMS_BLOCK_FRAMES = 500  # Frames read at a time when measuring levels, 10 seconds at FRAME_SECONDS
+CHUNKING_MIN_RATIO = 1.2  # Recordings up to this many chunk lengths are sent whole, see split_at_silence
+SILENCE_RMS = 10 ** (-40 / 20)  # Frames quieter than -40 dBFS count as silence
+MAX_OVERLAP_WORDS = 30  # Words compared when removing text repeated across an overlap
+MAX_FRAGMENT_WORDS = 2  # Trailing words of a chunk allowed to differ, e.g. a word cut in half
+
+# A chunk: (first sample, end sample, whether it overlaps the previous chunk)
+Chunk = Tuple[int, int, bool]
+TranscriptionFile = Tuple[str, Union[bytes, IO[bytes]]]
+
+_WORD_EDGE_RE = re.compile(r"^\W+|\W+$")
+
+
+def probe_duration(path: Path) -> Optional[float]:
+    """
+    Length of a recording in seconds, read from its headers without decoding it; None
+    when unknown. soundfile reads WAV, FLAC, Ogg and MP3; browser recordings (WebM/Opus,
+    MP4/AAC) need ffprobe.
+    """
+    try:
+        return sf.info(str(path)).duration
+    except (RuntimeError, TypeError):
+        pass
+    if FFPROBE is None:
+        return None
+    result = subprocess.run(
+        [FFPROBE, "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(path)],
+        capture_output=True, text=True,
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        pass
+    # MediaRecorder writes WebM without a duration; demuxing (not decoding) finds the last packet
+    last = None
+    with subprocess.Popen(
+        [FFPROBE, "-v", "error", "-select_streams", "a:0", "-show_entries", "packet=pts_time", "-of", "csv=p=0", str(path)],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    ) as probe:
+        for line in probe.stdout:
+            try:
+                last = float(line.strip().rstrip(","))
+            except ValueError:
+                continue
+    return last
+
+
+def readable_source(path: Path) -> Optional[Path]:
+    """
+    A file soundfile can read the recording from: `path` itself, or a 16 kHz mono WAV
+    that ffmpeg decodes it to beside it, which the caller deletes. The WAV is named like
+    a spooled upload, so `remove_stale_uploads` clears it if the worker dies. Returns
+    None when neither works.
+    """
+    try:
+        sf.info(str(path))
+        return path
+    except (RuntimeError, TypeError):
+        pass
+    if FFMPEG is None:
+        return None
+    fd, name = tempfile.mkstemp(dir=path.parent, prefix="upload-", suffix=".wav")
+    os.close(fd)
+    result = subprocess.run(
+        [FFMPEG, "-nostdin", "-v", "error", "-y", "-i", str(path), "-ac", "1", "-ar", str(DECODE_SAMPLE_RATE),
+         "-c:a", "pcm_s16le", "-f", "wav", name],
+        capture_output=True,
+    )
+    if result.returncode != 0:
+        logger.warning(f"ffmpeg could not decode {path.name}: {result.stderr.decode(errors='replace').strip()}")
+        Path(name).unlink(missing_ok=True)
+        return None
+    return Path(name)
+
+
+def frame_rms(path: Path, frame: int) -> np.ndarray:
+    """
+    RMS level of each whole `frame`-sample frame of a recording, from 0 (silence) to 1
+    (full scale). The file is read RMS_BLOCK_FRAMES frames at a time, so only the
+    levels, not the signal, are held in memory.
+    """
+    levels = []
+    for block in sf.blocks(str(path), blocksize=frame * RMS_BLOCK_FRAMES, dtype="float32", always_2d=True):
+        n_frames = len(block) // frame
+        frames = block[:n_frames * frame].mean(axis=1).reshape(n_frames, frame)
+        levels.append(np.sqrt(np.mean(frames * frames, axis=1)))
+    return np.concatenate(levels) if levels else np.zeros(0, dtype=np.float32)
+
+
+def split_at_silence(path: Path, chunk_seconds: float, overlap_seconds: float) -> List[Chunk]:
+    """
+    Splits a recording into chunks of roughly `chunk_seconds`, cutting each at the
+    quietest point within a fifth of a chunk of its target length (the one nearest the
+    target when several are about as quiet, e.g. any frame of silence). Cuts that don't land
+    on silence may fall inside a word, so the next chunk then starts `overlap_seconds`
+    early and the repeated words are removed when the transcripts are stitched.
+    """
+    info = sf.info(str(path))
+    rate = info.samplerate
+    frame = max(1, int(rate * FRAME_SECONDS))
+    rms = frame_rms(path, frame)
+    chunk_frames = max(1, int(chunk_seconds / FRAME_SECONDS))
+    search = chunk_frames // 5
+    overlap = int(overlap_seconds * rate)
+
+    chunks: List[Chunk] = []
+    start_frame, start_sample, overlaps = 0, 0, False
+    # The final chunk may run long by up to `search` rather than leave a short tail
+    while len(rms) - start_frame > chunk_frames + search:
+        target = start_frame + chunk_frames
+        window = rms[target - search:target + search]
+        candidates = np.flatnonzero(window <= max(window.min() * 1.25, SILENCE_RMS))
+        cut = target - search + int(candidates[np.argmin(np.abs(candidates - search))])
+        chunks.append((start_sample, cut * frame, overlaps))
+        overlaps = bool(rms[cut] >= SILENCE_RMS)
+        start_frame = cut
+        start_sample = max(0, cut * frame - overlap) if overlaps else cut * frame
+    chunks.append((start_sample, info.frames, overlaps))
+    return chunks
+
+
+def _normalize_word(word: str) -> str:
+    return _WORD_EDGE_RE.sub("", word.casefold())
+
+
+def merge_overlap(previous: List[str], following: List[str]) -> List[str]:
+    """
+    Joins the words of two overlapping transcripts, dropping the longest run at the
+    start of `following` that repeats the end of `previous`. Up to MAX_FRAGMENT_WORDS
+    words after the repeat in `previous` (a word cut off at the chunk edge) are dropped too.
+    """
+    tail = [_normalize_word(w) for w in previous[-MAX_OVERLAP_WORDS:]]
+    head = [_normalize_word(w) for w in following[:MAX_OVERLAP_WORDS]]
+    for length in range(min(len(tail), len(head)), 0, -1):
+        for fragment in range(MAX_FRAGMENT_WORDS + 1):
+            end = len(tail) - fragment
+            # A single repeated word is only trusted when it ends the previous chunk
+            if end < length or (fragment and length < 2):
+                continue
+            if tail[end - length:end] == head[:length]:
+                return previous[:len(previous) - fragment] + following[length:]
+    return previous + following
+
+
+def stitch_transcripts(texts: List[str], overlaps: List[bool]) -> str:
+    """Joins chunk transcripts in order, de-duplicating the text of overlapping chunks."""
+    words: List[str] = []
+    for text, overlap in zip(texts, overlaps):
+        chunk_words = text.split()
+        words = merge_overlap(words, chunk_words) if overlap else words + chunk_words
+    return " ".join(words)
+
+
+def encode_chunk(path: Path, start: int, end: int) -> bytes:
+    """Reads samples [start, end) of a recording, mixed down to mono, and encodes them as FLAC."""
+    samples, rate = sf.read(str(path), start=start, stop=end, dtype="int16", always_2d=True)
+    mono = samples.mean(axis=1).astype(np.int16) if samples.shape[1] > 1 else samples[:, 0]
+    buffer = io.BytesIO()
+    sf.write(buffer, mono, rate, format="FLAC", subtype="PCM_16")
+    return buffer.getvalue()
+
+
+class ChunkedTranscriber:
+    """
+    Transcribes recordings through `transcribe(file)`, which takes an OpenAI-style
+    (filename, content) upload. Recordings longer than about 1.2 × `chunk_seconds` are
+    split at silences and the chunks transcribed concurrently, at most
+    `max_concurrency` chunks at a time across all requests, then stitched back together
+    in order. Shorter recordings, ones whose length or audio can't be read, and
+    everything when `chunk_seconds` is 0 are sent whole, without waiting for a slot.
+    Only the level of the audio is kept in memory while splitting; each chunk's samples
+    are read from disk as it is encoded. Calls run on the shared loop, so the API
+    client's connection pool outlives the request loops Flask creates.
+    """
+
+    def __init__(
+        self,
+        transcribe: Callable[[TranscriptionFile], Awaitable[str]],
+        chunk_seconds: float,
+        overlap_seconds: float,
+        max_concurrency: int,
+    ):
+        self._transcribe = transcribe
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore: Optional[asyncio.Semaphore] = None  # Created on the shared loop, which it belongs to
+
+    async def transcribe(self, path: Path, filename: str) -> str:
+        return await shared_loop.run(self._transcribe_file(Path(path), filename))
+
+    def _segment(self, path: Path) -> Optional[Tuple[float, Path, List[Chunk]]]:
+        """
+        (duration, readable source, chunks) for a recording long enough to split, or None
+        to send it whole. The duration comes from the file's headers, so short recordings
+        are never decoded.
+        """
+        with span("audio_segmentation"):
+            duration = probe_duration(path)
+            if duration is None or duration <= self.chunk_seconds * CHUNKING_MIN_RATIO:
+                return None
+            source = readable_source(path)
+            if source is None:
+                logger.info(f"Cannot decode {path.name} for chunking; transcribing it in one request.")
+                return None
+            try:
+                return duration, source, split_at_silence(source, self.chunk_seconds, self.overlap_seconds)
+            except BaseException:
+                if source != path:
+                    source.unlink(missing_ok=True)
+                raise
+
+    async def _transcribe_file(self, path: Path, filename: str) -> str:
+        segmented = await asyncio.to_thread(self._segment, path) if self.chunk_seconds > 0 else None
+        if segmented is None:
+            return await self._transcribe_whole(path, filename)
+
+        duration, source, chunks = segmented
+        try:
+            if len(chunks) == 1:
+                return await self._transcribe_whole(path, filename)
+            logger.info(f"Transcribing {filename} ({duration:.1f}s) in {len(chunks)} chunks.")
+            return await self._transcribe_chunks(source, Path(filename or "audio").stem, chunks)
+        finally:
+            if source != path:
+                source.unlink(missing_ok=True)
+
+    async def _transcribe_whole(self, path: Path, filename: str) -> str:
+        with open(path, "rb") as audio:
+            return await self._transcribe((filename, audio))
+
+    async def _transcribe_chunks(self, source: Path, stem: str, chunks: List[Chunk]) -> str:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def transcribe_chunk(index: int, start: int, end: int) -> str:
+            async with self._semaphore:
+                with span("transcription_chunk"):
+                    content = await asyncio.to_thread(encode_chunk, source, start, end)
+                    return await self._transcribe((f"{stem}-{index}.flac", content))
+
+        tasks = [asyncio.ensure_future(transcribe_chunk(i, start, end)) for i, (start, end, _) in enumerate(chunks)]
+        try:
+            texts = await asyncio.gather(*tasks)
+        except BaseException:
+            # One failed chunk fails the transcript, so don't keep paying for the others
+            for task in tasks:
+                task.cancel()
+            raise
+        return stitch_transcripts(texts, [overlaps for _, _, overlaps in chunks])
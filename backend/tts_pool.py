@@ -0,0 +1,133 @@
+import io
+import os
+import wave
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from voices import VoiceRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class TTSPoolSaturated(RuntimeError):
+    """Raised when the TTS pool already has its maximum number of jobs queued."""
+
+
+# --- WORKER PROCESS SIDE ---
+
+# Voices of this worker process, created by `_init_worker`
+_worker_registry: Optional[VoiceRegistry] = None
+
+
+def _init_worker(model_paths: Dict[str, str], preload: List[str]) -> None:
+    """Loads and warms up the preloaded voices; the rest load on their first job."""
+    global _worker_registry
+    _worker_registry = VoiceRegistry(model_paths)
+    _worker_registry.preload(preload)
+
+
+def _synthesize_job(text: str, lang: str) -> bytes:
+    """Renders narration text to WAV bytes inside a worker process."""
+    voice = _worker_registry.get(lang)
+    with io.BytesIO() as wav_buffer:
+        with wave.open(wav_buffer, "wb") as wav_file:
+            voice.synthesize_wav(text, wav_file)
+        return wav_buffer.getvalue()
+
+
+def _status_job() -> Dict[str, Any]:
+    return {"pid": os.getpid(), "voices": _worker_registry.status()}
+
+
+# --- REQUEST SIDE ---
+
+class TTSExecutor:
+    """
+    Runs Piper synthesis in a dedicated process pool so ONNX inference never holds
+    the GIL of the request threads. Jobs beyond `max_queue` are rejected immediately
+    instead of piling up behind a saturated pool.
+    """
+
+    def __init__(self, model_paths: Dict[str, str], workers: int, max_queue: int, timeout: float,
+                 preload: Optional[List[str]] = None):
+        self.model_paths = dict(model_paths)
+        self.preload = list(preload or [])
+        self.workers = workers
+        self.max_queue = max(1, max_queue)
+        self.timeout = timeout
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # With the "spawn" start method every worker re-imports the application module,
+        # which must not start pools of its own (see `main.preload_voices`).
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_paths, self.preload),
+                )
+                logger.info(f"TTS process pool started with {self.workers} worker(s).")
+            return self._pool
+
+    def start(self) -> None:
+        """Spawns every worker up front so voice loading and warm-up happen before the first job."""
+        pool = self._get_pool()
+        # Each submission to a pool without idle workers spawns another one
+        for _ in range(self.workers):
+            pool.submit(_status_job)
+
+    def status(self, timeout: float = 2.0) -> Optional[Dict[str, Any]]:
+        """Pool occupancy plus the voices of one (arbitrary) worker, if the pool is running."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            pool = self._pool
+        status: Dict[str, Any] = {"workers": self.workers, "in_flight": self._in_flight, "worker": None}
+        if pool is not None:
+            try:
+                status["worker"] = pool.submit(_status_job).result(timeout=timeout)
+            except Exception as e:
+                logger.warning(f"Could not read TTS worker status: {e}")
+        return status
+
+    def _release_slot(self, _future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    async def synthesize(self, text: str, lang: str) -> bytes:
+        """Synthesizes `text` in the pool and returns WAV bytes."""
+        pool = self._get_pool()
+        with self._lock:
+            if self._in_flight >= self.max_queue:
+                raise TTSPoolSaturated(f"TTS pool saturated ({self._in_flight} jobs in flight).")
+            self._in_flight += 1
+        try:
+            future = pool.submit(_synthesize_job, text, lang)
+        except Exception:
+            self._release_slot(None)
+            raise
+        # The slot is only freed once the worker is actually done, even if we stop waiting.
+        future.add_done_callback(self._release_slot)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
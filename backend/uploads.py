@@ -0,0 +1,135 @@
+import time
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from typing import Callable
+
+from flask import Request
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import FormDataParser, MultiPartParser
+
+logger = logging.getLogger(__name__)
+
+
+class SpooledUpload:
+    """
+    An uploaded file written to a temporary file on disk as the request body is parsed,
+    instead of being buffered in memory. The upload is hashed and measured on the way
+    in, and rejected with 413 as soon as it grows past `max_bytes`. The file is deleted
+    when the upload is closed, which Flask does when the request ends. `field` is the
+    form field it was sent as.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, field: str = "file"):
+        self._file = tempfile.NamedTemporaryFile(dir=directory, prefix="upload-")
+        self.path = Path(self._file.name)
+        self.max_bytes = max_bytes
+        self.field = field
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.close()
+            raise RequestEntityTooLarge(f"The {self.field} upload is larger than the {self.max_bytes}-byte limit.")
+        self._sha256.update(data)
+        return self._file.write(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def readline(self, size: int = -1) -> bytes:
+        return self._file.readline(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    @property
+    def name(self) -> str:
+        return self._file.name
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    @property
+    def sha256(self) -> str:
+        """Hex SHA-256 of the upload, computed while it was written."""
+        return self._sha256.hexdigest()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def spooling_request_class(directory: Path, max_bytes: Callable[[str], int]) -> type:
+    """
+    A Flask request class that spools every uploaded file to `directory` via
+    `SpooledUpload`, limited while it is received to `max_bytes(field name)` bytes.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    class SpoolingMultiPartParser(MultiPartParser):
+        def start_file_streaming(self, event, total_content_length):
+            return SpooledUpload(directory, max_bytes(event.name), event.name)
+
+    class SpoolingFormDataParser(FormDataParser):
+        # Werkzeug's stream factories are only told the filename, so the multipart parser
+        # is replaced by one that opens each file's spool knowing its form field
+        def _parse_multipart(self, stream, mimetype, content_length, options):
+            boundary = options.get("boundary", "").encode("ascii")
+            if not boundary:
+                raise ValueError("Missing boundary")
+            parser = SpoolingMultiPartParser(
+                max_form_memory_size=self.max_form_memory_size, max_form_parts=self.max_form_parts, cls=self.cls
+            )
+            form, files = parser.parse(stream, boundary, content_length)
+            return stream, form, files
+
+    class SpoolingRequest(Request):
+        form_data_parser_class = SpoolingFormDataParser
+
+    return SpoolingRequest
+
+
+def upload_path(file: FileStorage) -> Path:
+    """The on-disk path of an upload received through a `spooling_request_class` request."""
+    file.stream.flush()
+    return file.stream.path
+
+
+def upload_sha256(file: FileStorage) -> str:
+    return file.stream.sha256
+
+
+def remove_stale_uploads(directory: Path, max_age: float) -> None:
+    """Deletes spooled uploads left behind by a worker that died mid-request."""
+    cutoff = time.time() - max_age
+    removed = 0
+    for path in Path(directory).glob("upload-*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except OSError:
+            continue
+    if removed:
+        logger.info(f"Removed {removed} stale upload(s) from {directory}.")
@@ -0,0 +1,119 @@
+import os
+import io
+import time
+import wave
+import logging
+import resource
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_TEXT = "Hello."
+
+
+def discover_voices(voices_dir: Path) -> Dict[str, str]:
+    """
+    Maps language codes to Piper model paths for every `<lang>-<name>.onnx.json` config
+    in `voices_dir`. The `.onnx` weights are resolved next to it; a missing weights
+    file is reported when the voice is loaded, not here.
+    """
+    model_paths: Dict[str, str] = {}
+    for config_path in sorted(Path(voices_dir).glob("*.onnx.json")):
+        model_path = config_path.with_suffix("")  # Strip ".json"
+        lang = model_path.name.split("-", 1)[0]
+        if lang in model_paths:
+            logger.warning(f"Several voices found for '{lang}'; using {Path(model_paths[lang]).name}.")
+            continue
+        model_paths[lang] = str(model_path)
+    return model_paths
+
+
+def _resident_bytes() -> int:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class VoiceRegistry:
+    """
+    Loads Piper voices on demand or up front, at most once per language per process.
+
+    Concurrent requests for a voice that is still loading wait on a per-language lock
+    instead of loading it again. Each load is followed by a short warm-up synthesis so
+    the first real narration doesn't pay for ONNX session initialisation. Memory is
+    measured as the change in resident set size across load and warm-up, which is only
+    approximate when other allocations happen at the same time.
+    """
+
+    def __init__(self, model_paths: Dict[str, str]):
+        self.model_paths = dict(model_paths)
+        self._voices: Dict[str, Any] = {}
+        self._locks = {lang: threading.Lock() for lang in self.model_paths}
+        self._status: Dict[str, Dict[str, Any]] = {}
+
+    def __contains__(self, lang: str) -> bool:
+        return lang in self.model_paths
+
+    def get(self, lang: str):
+        """Returns the loaded voice for `lang`, loading it first if necessary."""
+        voice = self._voices.get(lang)
+        if voice is not None:
+            return voice
+        if lang not in self.model_paths:
+            raise LookupError(f"Unsupported language: {lang}")
+        with self._locks[lang]:
+            voice = self._voices.get(lang)
+            if voice is None:
+                voice = self._load(lang)
+            return voice
+
+    def _load(self, lang: str):
+        from piper import PiperVoice
+
+        model_path = self.model_paths[lang]
+        if not Path(model_path).exists():
+            raise FileNotFoundError(f"Voice model file not found at path: {model_path}")
+
+        rss_before = _resident_bytes()
+        started = time.perf_counter()
+        voice = PiperVoice.load(model_path)
+        loaded = time.perf_counter()
+        with io.BytesIO() as wav_buffer:
+            with wave.open(wav_buffer, "wb") as wav_file:
+                voice.synthesize_wav(WARM_UP_TEXT, wav_file)
+        warmed = time.perf_counter()
+
+        self._status[lang] = {
+            "load_seconds": round(loaded - started, 3),
+            "warmup_seconds": round(warmed - loaded, 3),
+            "memory_bytes": max(0, _resident_bytes() - rss_before),
+        }
+        self._voices[lang] = voice
+        logger.info(f"PiperVoice loaded for lang '{lang}' from {model_path}: {self._status[lang]}")
+        return voice
+
+    def preload(self, langs: Iterable[str]) -> None:
+        """Loads and warms up the given voices, logging rather than raising on failure."""
+        for lang in langs:
+            try:
+                self.get(lang)
+            except Exception as e:
+                logger.error(f"Failed to preload PiperVoice for lang '{lang}': {e}")
+
+    def status(self) -> List[Dict[str, Any]]:
+        voices = []
+        for lang, model_path in sorted(self.model_paths.items()):
+            path = Path(model_path)
+            voices.append({
+                "lang": lang,
+                "model": path.name,
+                "model_file_bytes": path.stat().st_size if path.exists() else None,
+                "loaded": lang in self._voices,
+                **self._status.get(lang, {}),
+            })
+        return voices
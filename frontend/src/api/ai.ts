@@ -2,7 +2,7 @@
 
 import { useAppStore, type LineData } from '../store/useAppStore'
 import renderMarkdownToImage from '../utils/renderToImage'
-import { speakText } from '../utils/tts'
+import { speakText, fetchAudio, playAudioBuffer, decodeAudioDataUrl } from '../utils/tts'
 // Import the backend URL from the config
 import { BACKEND_URL } from '../config'
 
@@ -118,14 +118,72 @@ const processElement = async (element: any) => {
     // STEP 2: Speak the narration *after* rendering.
     // The 'await' here ensures the next element in the queue won't be processed
     // until this audio finishes, creating the desired sequential flow.
-    const audioDataUrl = element.audioDataUrl || '';
-    if (audioDataUrl && typeof audioDataUrl === 'string') {
-        await speakText(audioDataUrl).catch(console.error);
+    if (element.narrationId) {
+        // Streamed narration: play each sentence as soon as it has arrived.
+        for (let index = 0; index < (element.narrationChunks || 0); index++) {
+            await playAudioBuffer(await narrationChunk(element.narrationId, index)).catch(console.error);
+        }
+        forgetNarration(element.narrationId);
+    } else if (element.audioPromise) {
+        // Audio served by URL was already being downloaded while the element rendered.
+        await playAudioBuffer(await element.audioPromise).catch(console.error);
+    } else {
+        const audioDataUrl = element.audioDataUrl || '';
+        if (audioDataUrl && typeof audioDataUrl === 'string') {
+            await speakText(audioDataUrl).catch(console.error);
+        }
     }
 
     console.log(`Finished processing ${element.type} element`);
 };
 
+// Sentence-level narration chunks, keyed by "<narrationId>:<index>".
+// Each entry resolves to the chunk's audio once its SSE event has arrived.
+type AudioPromise = Promise<ArrayBuffer | null>;
+const narrationChunks = new Map<string, { promise: AudioPromise, resolve: (audio: AudioPromise) => void }>();
+
+const narrationSlot = (id: string, index: number) => {
+    const key = `${id}:${index}`;
+    let slot = narrationChunks.get(key);
+    if (!slot) {
+        let resolve!: (audio: AudioPromise) => void;
+        const promise = new Promise<ArrayBuffer | null>((r) => { resolve = r; });
+        slot = { promise, resolve };
+        narrationChunks.set(key, slot);
+    }
+    return slot;
+};
+
+const narrationChunk = (id: string, index: number): AudioPromise => narrationSlot(id, index).promise;
+
+const forgetNarration = (id: string) => {
+    for (const key of narrationChunks.keys()) {
+        if (key.startsWith(`${id}:`)) narrationChunks.delete(key);
+    }
+};
+
+/**
+ * Stores one narration chunk event. Audio delivered by URL starts downloading immediately.
+ */
+const receiveNarrationChunk = (chunk: any) => {
+    let audio: AudioPromise = Promise.resolve(null);
+    if (typeof chunk.audioUrl === 'string' && chunk.audioUrl) {
+        audio = fetchAudio(new URL(chunk.audioUrl, BACKEND_URL).toString());
+    } else if (typeof chunk.audioDataUrl === 'string' && chunk.audioDataUrl) {
+        audio = Promise.resolve(decodeAudioDataUrl(chunk.audioDataUrl));
+    }
+    narrationSlot(chunk.id, chunk.index).resolve(audio);
+};
+
+/**
+ * Releases any element still waiting for narration chunks that will never arrive.
+ */
+const releasePendingNarration = () => {
+    for (const slot of narrationChunks.values()) {
+        slot.resolve(Promise.resolve(null));
+    }
+};
+
 // Queue system for sequential element processing
 let elementQueue: any[] = [];
 let isProcessingQueue = false;
@@ -213,6 +271,7 @@ export const handleAudioAndGenerateCanvas = async (audioBlob: Blob, sessionId: s
         if (e.data === '[DONE]') {
             source.close()
             setAiState('idle')
+            releasePendingNarration()
             return
         }
         let element: any
@@ -223,6 +282,22 @@ export const handleAudioAndGenerateCanvas = async (audioBlob: Blob, sessionId: s
             return
         }
 
+        if (element.narration) {
+            receiveNarrationChunk(element.narration)
+            return
+        }
+
+        // Timing breakdown, only sent when the stream was opened with `trace=1`
+        if (element.trace) {
+            console.debug('reply trace', element.trace)
+            return
+        }
+
+        // Start downloading URL-delivered narration right away, in parallel with rendering
+        if (typeof element.audioUrl === 'string' && element.audioUrl) {
+            element.audioPromise = fetchAudio(new URL(element.audioUrl, BACKEND_URL).toString());
+        }
+
         // Add element to queue for sequential processing
         elementQueue.push(element);
         // Start processing the queue if it's not already running.
@@ -233,6 +308,7 @@ export const handleAudioAndGenerateCanvas = async (audioBlob: Blob, sessionId: s
         console.error('SSE connection error:', err)
         source.close()
         setAiState('idle')
+        releasePendingNarration()
     }
 }
 
@@ -12,9 +12,10 @@ interface LanguageSelectorProps {
 }
 
 export const LanguageSelector: React.FC<LanguageSelectorProps> = ({ isMobile = false }) => {
-    const { recognitionLang, isUploading, actions } = useAppStore(
+    const { recognitionLang, sessionId, isUploading, actions } = useAppStore(
         useShallow(state => ({
             recognitionLang: state.recognitionLang,
+            sessionId: state.sessionId,
             isUploading: state.isUploading,
             actions: state.actions,
         }))
@@ -25,7 +26,7 @@ export const LanguageSelector: React.FC<LanguageSelectorProps> = ({ isMobile = f
             await fetch("/api/set-language", {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ lang }),
+                body: JSON.stringify({ lang, session_id: sessionId }),
             });
         } catch (e) {
             // Optionally handle error (silent fail)
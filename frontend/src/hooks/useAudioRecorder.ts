@@ -4,7 +4,6 @@ import { useRef, useCallback } from 'react';
 import { useAppStore } from '../store/useAppStore';
 import { handleAudioAndGenerateCanvas } from '../api/ai';
 import { useShallow } from 'zustand/react/shallow';
-import { v4 as uuidv4 } from 'uuid';
 import { unlockAudioContext } from '../utils/tts';
 
 /**
@@ -15,10 +14,11 @@ export const useAudioRecorder = () => {
     const mediaRecorderRef = useRef<MediaRecorder | null>(null);
     const audioChunksRef = useRef<Blob[]>([]);
 
-    const { aiState, editingElementId, isUploading, actions } = useAppStore(useShallow(state => ({
+    const { aiState, editingElementId, isUploading, sessionId, actions } = useAppStore(useShallow(state => ({
         aiState: state.aiState,
         editingElementId: state.editingElementId,
         isUploading: state.isUploading,
+        sessionId: state.sessionId,
         actions: state.actions,
     })));
 
@@ -46,7 +46,6 @@ export const useAudioRecorder = () => {
             const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
             actions.setAiState('listening');
             audioChunksRef.current = [];
-            const newSessionId = uuidv4();
 
             const recorder = new MediaRecorder(stream);
             mediaRecorderRef.current = recorder;
@@ -62,7 +61,7 @@ export const useAudioRecorder = () => {
                 const audioBlob = new Blob(audioChunksRef.current, { type: 'audio/webm' });
                 // Ensure there's actual audio data to send
                 if (audioBlob.size > 100) {
-                    handleAudioAndGenerateCanvas(audioBlob, newSessionId);
+                    handleAudioAndGenerateCanvas(audioBlob, sessionId);
                 } else {
                     actions.setAiState('idle');
                 }
@@ -76,7 +75,7 @@ export const useAudioRecorder = () => {
             console.error('Failed to get microphone access or start recording:', error);
             actions.setAiState('idle');
         }
-    }, [aiState, editingElementId, isUploading, actions]);
+    }, [aiState, editingElementId, isUploading, sessionId, actions]);
 
     return { startRecording, stopRecording };
 };
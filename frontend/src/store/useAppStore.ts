@@ -1,4 +1,5 @@
 import { create } from 'zustand';
+import { v4 as uuidv4 } from 'uuid';
 
 //——————————————————————————————————————//
 // 1. TYPE DEFINITIONS & ZUSTAND STORE
@@ -49,6 +50,7 @@ export interface AppState {
     isUploading: boolean;
     penMode: 'free' | 'line';
     recognitionLang: string; // ✨ STATE ADDED
+    sessionId: string; // Identifies this tab's session (language, documents) to the backend
     difficulty: string; // ✨ STATE ADDED
     pdfFile: File | null;
     pdfPreview: string | null;
@@ -91,6 +93,7 @@ export const useAppStore = create<AppState>((set, get) => ({
     isUploading: false,
     penMode: 'free',
     recognitionLang: 'en-US', // ✨ DEFAULT LANGUAGE
+    sessionId: uuidv4(),
     difficulty: 'easy', // ✨ DEFAULT DIFFICULTY
     pdfFile: null,
     pdfPreview: null,
@@ -33,12 +33,20 @@ export async function speakText(audioDataUrl: string): Promise<void> {
     if (!audioDataUrl) {
         return Promise.resolve();
     }
+    return playAudioBuffer(decodeAudioDataUrl(audioDataUrl));
+}
 
+/**
+ * Extracts the encoded audio bytes from a base64 data URL.
+ * Returns null if the string is not an audio data URL.
+ * @param audioDataUrl The base64 data URL (e.g., "data:audio/wav;base64,...").
+ */
+export function decodeAudioDataUrl(audioDataUrl: string): ArrayBuffer | null {
     // Extract base64 and mime type
     const match = audioDataUrl.match(/^data:(audio\/[a-zA-Z0-9\-+.]+);base64,(.*)$/);
     if (!match) {
         console.error("Invalid audio data URL format");
-        return Promise.resolve();
+        return null;
     }
     const base64 = match[2];
     const binary = atob(base64);
@@ -47,6 +55,37 @@ export async function speakText(audioDataUrl: string): Promise<void> {
     for (let i = 0; i < len; i++) {
         bytes[i] = binary.charCodeAt(i);
     }
+    return bytes.buffer;
+}
+
+/**
+ * Downloads encoded narration audio (e.g. an `audioUrl` from the backend).
+ * Call this as soon as the URL is known so the download overlaps with rendering.
+ * Resolves to null if the audio could not be fetched.
+ * @param url Absolute URL of the audio file.
+ */
+export async function fetchAudio(url: string): Promise<ArrayBuffer | null> {
+    try {
+        const response = await fetch(url);
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        return await response.arrayBuffer();
+    } catch (err) {
+        console.error("Error fetching narration audio:", err);
+        return null;
+    }
+}
+
+/**
+ * Decodes and plays encoded audio (WAV, MP3, Ogg...).
+ * Returns a Promise that resolves when the audio has finished playing.
+ * @param audioData The encoded audio bytes.
+ */
+export async function playAudioBuffer(audioData: ArrayBuffer | null): Promise<void> {
+    if (!audioData) {
+        return;
+    }
 
     const ctx = getAudioContext();
     // Resume context if needed
@@ -55,7 +94,7 @@ export async function speakText(audioDataUrl: string): Promise<void> {
     }
 
     return new Promise((resolve) => {
-        ctx.decodeAudioData(bytes.buffer.slice(0), (buffer) => {
+        ctx.decodeAudioData(audioData.slice(0), (buffer) => {
             const source = ctx.createBufferSource();
             source.buffer = buffer;
             source.connect(ctx.destination);